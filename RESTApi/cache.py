@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries also expire after a time to live.
+
+    Only meant to be used from the event loop thread, so it has no locking.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._timer = timer
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # does not count as a hit or refresh the entry
+        return key in self._data
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store value, ttl overrides the default time to live of the cache."""
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        self._data[key] = (self._timer() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,10 +1,25 @@
+import os
 from functools import lru_cache
-from typing import Optional
+from pathlib import Path
+from typing import Literal, Optional
 
-from dotenv import find_dotenv, load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-load_dotenv(find_dotenv(".env"))
+# explicit locations instead of find_dotenv walking the call stack and parent dirs,
+# ENV_FILE points to any other file
+ENV_FILES = (
+    [Path(os.environ["ENV_FILE"])]
+    if "ENV_FILE" in os.environ
+    else [Path(__file__).parent / ".env", Path(__file__).parent.parent / ".env"]
+)
+for env_file in ENV_FILES:
+    if env_file.is_file():
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
+        break
+
+SQLiteJournalMode = Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]
 
 
 class BaseConfig(BaseSettings):
@@ -19,9 +34,89 @@ class BaseConfig(BaseSettings):
 class GlobalConfig(BaseConfig):
     DATABASE_URL: Optional[str] = None
     DB_FORCE_ROLL_BACK: bool = False
+    # run pending migrations from lifespan, only safe with a single worker,
+    # python -m RESTApi and python -m RESTApi.db migrate migrate once instead,
+    # without either a worker refuses to start on an outdated schema
+    DB_MIGRATE_ON_STARTUP: bool = False
+    # queries taking longer are logged as warnings, None turns the log off
+    DB_SLOW_QUERY_SECONDS: Optional[float] = 0.1
+    # applied to every sqlite connection when it is opened
+    SQLITE_JOURNAL_MODE: SQLiteJournalMode = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    # negative values are KiB, -65536 is 64 MiB per connection
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_TEMP_STORE: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # replica for the reads of GET requests, for local testing
+    # READ_DATABASE_REFRESH_SECONDS copies the primary sqlite file over it,
+    # cached responses are only read from a copy newer than the last write
+    READ_DATABASE_URL: Optional[str] = None
+    READ_DATABASE_REFRESH_SECONDS: Optional[float] = None
+    # user records looked up by get_current_user
+    USER_CACHE_MAX_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: float = 60
+    # verified jwt claims, an entry never outlives the exp of its token
+    TOKEN_CACHE_MAX_SIZE: int = 4096
+    TOKEN_CACHE_TTL_SECONDS: float = 300
+    # bcrypt runs on its own threads, a login waits at most
+    # PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS for one before getting a 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5
+    # "memory", "redis" or "none", python -m RESTApi turns "memory" off when
+    # it starts several workers, a write would only invalidate one of them
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_MAX_SIZE: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 30
+    REDIS_URL: Optional[str] = None
+    # POST /upload/stream rejects bodies over UPLOAD_MAX_BYTES, at most
+    # UPLOAD_MAX_CONCURRENT run at once, others wait UPLOAD_QUEUE_TIMEOUT_SECONDS
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_MAX_CONCURRENT: int = 8
+    UPLOAD_QUEUE_TIMEOUT_SECONDS: float = 5
+    # set to an nginx internal location aliasing static/uploads, e.g. /_blobs,
+    # so downloads are sent by nginx with sendfile instead of by the worker
+    DOWNLOAD_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+    # resumable upload sessions idle for longer are garbage collected,
+    # every UPLOAD_SESSION_GC_INTERVAL_SECONDS by each worker
+    UPLOAD_SESSION_TTL_SECONDS: float = 24 * 60 * 60
+    UPLOAD_SESSION_GC_INTERVAL_SECONDS: Optional[float] = 60 * 60
+    # a PATCH holding a session for longer is taken to be dead, its claim
+    # can be taken over by the next PATCH
+    UPLOAD_PATCH_TIMEOUT_SECONDS: float = 10 * 60
+    # thumbnails and metadata of uploaded images, made by MEDIA_WORKERS
+    # processes per app worker, a failed job is retried MEDIA_JOB_MAX_ATTEMPTS times
+    MEDIA_PROCESSING: bool = True
+    MEDIA_WORKERS: int = 2
+    MEDIA_JOB_MAX_ATTEMPTS: int = 3
+    MEDIA_POLL_SECONDS: float = 5
+    # a running job not finished by then is taken over by another worker
+    MEDIA_JOB_TIMEOUT_SECONDS: float = 300
+    MEDIA_DRAIN_TIMEOUT_SECONDS: float = 30
+    # log records are written by a background thread, when LOG_QUEUE_SIZE
+    # records are waiting the new one is dropped, the oldest one is, or
+    # the logging call blocks
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_QUEUE_OVERFLOW: Literal["block", "drop_new", "drop_oldest"] = "drop_new"
+    # /metrics, with METRICS_DIR every worker writes its counters to a file
+    # there every METRICS_FLUSH_SECONDS and the endpoint adds them all up
+    METRICS_ENABLED: bool = True
+    METRICS_DIR: Optional[str] = None
+    METRICS_FLUSH_SECONDS: float = 5
+    # python -m RESTApi, SERVER_WORKERS defaults to the core count
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 3000
+    SERVER_WORKERS: Optional[int] = None
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    # how long a worker waits for in-flight requests after SIGTERM
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_ACCESS_LOG: bool = False
 
 
 class DevConfig(GlobalConfig):
+    # python main.py is one process, a fresh database works out of the box
+    DB_MIGRATE_ON_STARTUP: bool = True
     model_config = SettingsConfigDict(env_prefix="DEV_", case_sensitive=True)
 
 
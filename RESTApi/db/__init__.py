@@ -1 +1,13 @@
-from .setup import comment_table, database, lifespan, like_table, post_table, user_table
+from .setup import (
+    comment_table,
+    database,
+    lifespan,
+    like_table,
+    media_job_table,
+    media_table,
+    post_table,
+    read_database,
+    upload_session_table,
+    upload_table,
+    user_table,
+)
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import logging
+
+import databases
+import sqlalchemy
+
+from .migrations import migrate
+from .setup import database, like_table, post_table
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+async def reconcile_like_counts(db: databases.Database = database) -> int:
+    """Rebuild posts.like_count from the likes table.
+
+    Only the posts whose counter has drifted are rewritten.
+    Returns the number of posts that were fixed.
+    """
+    actual_likes = (
+        sqlalchemy.select(sqlalchemy.func.count(like_table.c.id))
+        .where(like_table.c.post_id == post_table.c.id)
+        .scalar_subquery()
+    )
+    drifted = post_table.c.like_count != actual_likes
+
+    count_query = sqlalchemy.select(sqlalchemy.func.count()).where(drifted)
+    query = post_table.update().where(drifted).values(like_count=actual_likes)
+    logger.debug(query)
+
+    async with db.transaction():
+        fixed: int = await db.fetch_val(count_query)
+        if fixed:
+            await db.execute(query)
+
+    logger.info("Reconciled like counters of %s posts", fixed)
+    return fixed
+
+
+async def _run(command: str) -> None:
+    async with database:
+        if command == "migrate":
+            applied = await migrate()
+            print(f"Applied migrations: {applied or 'none'}")
+        elif command == "reconcile-likes":
+            fixed = await reconcile_like_counts()
+            print(f"Fixed like_count on {fixed} posts")
+        elif command == "collect-uploads":
+            from ..resumable import collect_abandoned_uploads
+
+            removed = await collect_abandoned_uploads()
+            print(f"Removed {removed} abandoned partial uploads")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m RESTApi.db")
+    parser.add_argument(
+        "command",
+        choices=["migrate", "reconcile-likes", "collect-uploads"],
+        help="migrate: apply pending schema migrations, "
+        "reconcile-likes: rebuild posts.like_count from the likes table, "
+        "collect-uploads: delete expired upload sessions and their files",
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(_run(args.command))
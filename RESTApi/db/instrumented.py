@@ -0,0 +1,251 @@
+"""Timing of every query that goes through a Database.
+
+Queries are grouped by fingerprint, their SQL with the values replaced
+by ?, so the aggregates show which statement costs the most in total and
+the slow query log names it. The duration is what the caller waits,
+waiting for a connection included.
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+import databases
+import databases.core
+from asgi_correlation_id import correlation_id
+from sqlalchemy.sql import ClauseElement
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+OTHER = "<other>"
+
+_NORMALIZE = (
+    (re.compile(r"__\[POSTCOMPILE_\w+\]"), "?"),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"(?<![:\w]):\w+"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # IN lists and multi row VALUES of any length are one fingerprint
+    (re.compile(r"\?(?:\s*,\s*\?)+"), "?"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize(sql: str) -> str:
+    """The fingerprint of sql, its literals and parameters replaced by ?."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+@dataclass
+class QueryStats:
+    fingerprint: str
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+    slow: int = 0
+    # the request of the slowest call, to find it in the logs
+    slowest_correlation_id: str | None = None
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0
+
+
+class CountedConnection(databases.core.Connection):
+    """Tells its InstrumentedDatabase when it checks a backend connection
+    out and in, nested uses of the same connection count once.
+    """
+
+    def __init__(self, database: "InstrumentedDatabase", backend: Any) -> None:
+        super().__init__(database, backend)
+        self.depth: int = 0
+
+    async def __aenter__(self) -> "CountedConnection":
+        await super().__aenter__()
+        self.depth += 1
+        if self.depth == 1:
+            self._database.connections_in_use += 1
+            self._database.connections_opened += 1
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        try:
+            await super().__aexit__(*exc_info)
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self._database.connections_in_use -= 1
+
+
+class InstrumentedDatabase(databases.Database):
+    """A Database that times its queries and counts its connections.
+
+    Calls at or over slow_query_seconds are logged as warnings, None
+    disables the log. At most max_fingerprints statements are kept apart,
+    any later ones are added up under OTHER.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        slow_query_seconds: float | None = None,
+        max_fingerprints: int = 512,
+        **options: Any,
+    ) -> None:
+        super().__init__(url, **options)
+        self.slow_query_seconds: float | None = slow_query_seconds
+        self.max_fingerprints: int = max_fingerprints
+        self.query_stats: dict[str, QueryStats] = {}
+        # sqlalchemy cache key or raw sql -> fingerprint, str() of a
+        # statement compiles it, which costs more than most sqlite queries
+        self._fingerprints: dict[Any, str] = {}
+        self.connections_in_use: int = 0
+        self.connections_opened: int = 0
+
+    def connection(self) -> databases.core.Connection:
+        # as databases.Database.connection, with a connection that counts
+        if self._global_connection is not None:
+            return self._global_connection
+        if not self._connection:
+            self._connection = CountedConnection(self, self._backend)
+        return self._connection
+
+    def fingerprint(self, query: ClauseElement | str) -> str:
+        if isinstance(query, str):
+            key = query
+        else:
+            cache_key = query._generate_cache_key()
+            if cache_key is None:
+                return normalize(str(query))
+            key = cache_key.key
+        fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            fingerprint = normalize(str(query))
+            if len(self._fingerprints) < self.max_fingerprints * 4:
+                self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def record(
+        self,
+        operation: str,
+        query: ClauseElement | str,
+        seconds: float,
+        rows: int,
+        error: bool = False,
+    ) -> None:
+        fingerprint = self.fingerprint(query)
+        stats = self.query_stats.get(fingerprint)
+        if stats is None:
+            if len(self.query_stats) >= self.max_fingerprints:
+                fingerprint = OTHER
+            stats = self.query_stats.setdefault(fingerprint, QueryStats(fingerprint))
+        stats.calls += 1
+        stats.errors += error
+        stats.rows += rows
+        stats.total_seconds += seconds
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+            stats.slowest_correlation_id = correlation_id.get()
+
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            stats.slow += 1
+            logger.warning(
+                "Slow query %.1f ms, %s rows: %s",
+                seconds * 1000,
+                rows,
+                fingerprint,
+                extra={
+                    "fingerprint": fingerprint,
+                    "operation": operation,
+                    "duration_ms": round(seconds * 1000, 3),
+                    "rows": rows,
+                    "failed": error,
+                },
+            )
+
+    def top_queries(self, count: int = 10) -> list[QueryStats]:
+        """The statements that took the most time in total."""
+        ranked = sorted(
+            self.query_stats.values(), key=lambda s: s.total_seconds, reverse=True
+        )
+        return ranked[:count]
+
+    async def _timed(
+        self,
+        operation: str,
+        query: ClauseElement | str,
+        call: Awaitable,
+        count_rows: Callable[[Any], int],
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await call
+        except Exception:
+            self.record(operation, query, time.perf_counter() - start, 0, error=True)
+            raise
+        self.record(operation, query, time.perf_counter() - start, count_rows(result))
+        return result
+
+    async def execute(
+        self, query: ClauseElement | str, values: dict | None = None
+    ) -> Any:
+        return await self._timed(
+            "execute", query, super().execute(query, values), lambda _: 0
+        )
+
+    async def execute_many(self, query: ClauseElement | str, values: list) -> None:
+        return await self._timed(
+            "execute_many",
+            query,
+            super().execute_many(query, values),
+            lambda _: len(values),
+        )
+
+    async def fetch_all(
+        self, query: ClauseElement | str, values: dict | None = None
+    ) -> list:
+        return await self._timed(
+            "fetch_all", query, super().fetch_all(query, values), len
+        )
+
+    async def fetch_one(
+        self, query: ClauseElement | str, values: dict | None = None
+    ) -> Any:
+        return await self._timed(
+            "fetch_one",
+            query,
+            super().fetch_one(query, values),
+            lambda row: int(row is not None),
+        )
+
+    async def fetch_val(
+        self, query: ClauseElement | str, values: dict | None = None, column: Any = 0
+    ) -> Any:
+        return await self._timed(
+            "fetch_val",
+            query,
+            super().fetch_val(query, values, column=column),
+            lambda value: int(value is not None),
+        )
+
+    async def iterate(
+        self, query: ClauseElement | str, values: dict | None = None
+    ) -> AsyncGenerator:
+        start = time.perf_counter()
+        rows = 0
+        error = False
+        try:
+            async for row in super().iterate(query, values):
+                rows += 1
+                yield row
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record("iterate", query, time.perf_counter() - start, rows, error)
@@ -0,0 +1,239 @@
+"""Versioned schema migrations.
+
+The schema is only ever changed by appending a Migration to MIGRATIONS,
+the Table definitions in setup.py describe the result of applying all of them.
+Applied versions are recorded in the schema_version table.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import databases
+
+from ..config import config
+from .setup import connect_options, database
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+Step = str | Callable[[databases.Database], Awaitable[None]]
+
+
+class SchemaOutdatedError(Exception):
+    """Raised at startup when migrations are pending and not run from lifespan."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: tuple[Step, ...]
+
+
+async def add_like_count(db: databases.Database) -> None:
+    columns = await db.fetch_all("PRAGMA table_info(posts)")
+    if "like_count" not in {column.name for column in columns}:
+        await db.execute(
+            "ALTER TABLE posts ADD COLUMN like_count INTEGER DEFAULT '0' NOT NULL"
+        )
+    await db.execute(
+        "UPDATE posts SET like_count = "
+        "(SELECT count(likes.id) FROM likes WHERE likes.post_id = posts.id)"
+    )
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        1,
+        "initial schema",
+        (
+            """CREATE TABLE IF NOT EXISTS users (
+                id INTEGER NOT NULL,
+                email VARCHAR,
+                password VARCHAR,
+                confirmed BOOLEAN,
+                PRIMARY KEY (id),
+                UNIQUE (email)
+            )""",
+            """CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER NOT NULL,
+                body VARCHAR,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(user_id) REFERENCES users (id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS comments (
+                id INTEGER NOT NULL,
+                body VARCHAR,
+                post_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(post_id) REFERENCES posts (id),
+                FOREIGN KEY(user_id) REFERENCES users (id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS likes (
+                id INTEGER NOT NULL,
+                post_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(post_id) REFERENCES posts (id),
+                FOREIGN KEY(user_id) REFERENCES users (id)
+            )""",
+        ),
+    ),
+    Migration(2, "posts.like_count counter", (add_like_count,)),
+    Migration(
+        3,
+        "foreign key indexes",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_posts_user_id ON posts (user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_posts_like_count_id "
+            "ON posts (like_count, id)",
+            "CREATE INDEX IF NOT EXISTS ix_comments_post_id_id "
+            "ON comments (post_id, id)",
+            "CREATE INDEX IF NOT EXISTS ix_comments_user_id ON comments (user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_likes_post_id_user_id "
+            "ON likes (post_id, user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_likes_user_id ON likes (user_id)",
+        ),
+    ),
+    Migration(
+        4,
+        "content addressed uploads",
+        (
+            """CREATE TABLE IF NOT EXISTS uploads (
+                id INTEGER NOT NULL,
+                filename VARCHAR NOT NULL,
+                digest VARCHAR(64) NOT NULL,
+                size INTEGER NOT NULL,
+                content_type VARCHAR NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                PRIMARY KEY (id)
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_uploads_digest ON uploads (digest)",
+        ),
+    ),
+    Migration(
+        5,
+        "resumable upload sessions",
+        (
+            """CREATE TABLE IF NOT EXISTS upload_sessions (
+                id VARCHAR(32) NOT NULL,
+                filename VARCHAR NOT NULL,
+                content_type VARCHAR NOT NULL,
+                size INTEGER NOT NULL,
+                upload_offset INTEGER DEFAULT '0' NOT NULL,
+                expires_at FLOAT NOT NULL,
+                PRIMARY KEY (id)
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_upload_sessions_expires_at "
+            "ON upload_sessions (expires_at)",
+        ),
+    ),
+    Migration(
+        6,
+        "media processing",
+        (
+            """CREATE TABLE IF NOT EXISTS media_jobs (
+                id INTEGER NOT NULL,
+                digest VARCHAR(64) NOT NULL,
+                content_type VARCHAR NOT NULL,
+                status VARCHAR NOT NULL,
+                attempts INTEGER NOT NULL,
+                error VARCHAR,
+                run_after FLOAT NOT NULL,
+                claimed_by VARCHAR(32),
+                claimed_at FLOAT,
+                PRIMARY KEY (id),
+                UNIQUE (digest)
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_media_jobs_status_run_after "
+            "ON media_jobs (status, run_after)",
+            """CREATE TABLE IF NOT EXISTS media (
+                id INTEGER NOT NULL,
+                digest VARCHAR(64) NOT NULL,
+                preset VARCHAR NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                content_type VARCHAR NOT NULL,
+                rendition_digest VARCHAR(64) NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (id)
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_media_digest ON media (digest)",
+            "CREATE INDEX IF NOT EXISTS ix_media_rendition_digest "
+            "ON media (rendition_digest)",
+        ),
+    ),
+    Migration(
+        7,
+        "upload session claims",
+        (
+            "ALTER TABLE upload_sessions ADD COLUMN claimed_by VARCHAR(32)",
+            "ALTER TABLE upload_sessions ADD COLUMN claimed_at FLOAT",
+        ),
+    ),
+)
+
+
+async def schema_version(db: databases.Database) -> int:
+    await db.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER NOT NULL PRIMARY KEY,
+            description VARCHAR NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""")
+    return await db.fetch_val("SELECT coalesce(max(version), 0) FROM schema_version")
+
+
+async def migrate(db: databases.Database = database) -> list[int]:
+    """Applies the pending migrations in one transaction.
+
+    Safe to call on every start, it returns the versions it applied.
+    Databases created by the old import time create_all have no
+    schema_version table, the steps are written to accept them.
+    """
+    applied: list[int] = []
+    async with db.transaction():
+        current = await schema_version(db)
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            logger.info(
+                "Applying migration %s: %s", migration.version, migration.description
+            )
+            for step in migration.steps:
+                if isinstance(step, str):
+                    await db.execute(step)
+                else:
+                    await step(db)
+            await db.execute(
+                "INSERT INTO schema_version (version, description) "
+                "VALUES (:version, :description)",
+                {"version": migration.version, "description": migration.description},
+            )
+            applied.append(migration.version)
+
+    if not applied:
+        logger.info("Database schema is up to date at version %s", current)
+    return applied
+
+
+async def check_schema(db: databases.Database = database) -> None:
+    """Fails fast when the database misses migrations, instead of every
+    query failing on a missing table or column.
+    """
+    current = await schema_version(db)
+    latest = MIGRATIONS[-1].version
+    if current < latest:
+        raise SchemaOutdatedError(
+            f"Database schema is at version {current}, the app needs {latest}, "
+            "run python -m RESTApi.db migrate"
+        )
+
+
+async def migrate_url(url: str) -> list[int]:
+    """Migrates the database at url on a connection of its own, committed
+    even when the app database runs with force_rollback.
+    """
+    async with databases.Database(url, **connect_options(url, config)) as db:
+        return await migrate(db)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import databases
+
+from .setup import database, read_database
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# only set inside safe (read only) requests, everything else stays on the primary
+_use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+# when the last copy made by refresh_replica_periodically started, None while
+# there is none, or when something else syncs the replica and its lag is unknown
+replica_synced_at: float | None = None
+
+
+def reader() -> databases.Database:
+    """The database read only handlers should query."""
+    return read_database if _use_replica.get() else database
+
+
+def replica_synced_since(moment: float) -> bool:
+    """Whether the replica has every write committed before moment."""
+    return replica_synced_at is not None and replica_synced_at > moment
+
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaMiddleware:
+    """Routes the reads of GET and HEAD requests to the replica.
+
+    Other methods write, so their reads (read after write included)
+    go to the primary.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            with replica_reads():
+                await self.app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def copy_database(source: str, target: str) -> None:
+    """Copies the sqlite file source over target with the online backup API,
+    so readers of target never see a half written file.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+async def refresh_replica_periodically(interval: float) -> None:
+    """Keeps a local sqlite replica file in sync with the primary one."""
+    global replica_synced_at
+    source, target = database.url.database, read_database.url.database
+    while True:
+        try:
+            started = time.time()
+            await asyncio.to_thread(copy_database, source, target)
+            replica_synced_at = started
+            logger.debug("Replica %s refreshed from %s", target, source)
+        except sqlite3.Error:
+            logger.exception("Replica refresh failed")
+        await asyncio.sleep(interval)
@@ -1,11 +1,14 @@
+import sqlite3
 from contextlib import asynccontextmanager
 
 import databases
 import sqlalchemy
 from fastapi import FastAPI
 
-from ..config import config
+from ..config import GlobalConfig, config
+from .instrumented import InstrumentedDatabase
 
+# the tables are created and upgraded by migrations.py, not from this metadata
 metadata = sqlalchemy.MetaData()
 
 post_table = sqlalchemy.Table(
@@ -14,6 +17,13 @@ post_table = sqlalchemy.Table(
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
     sqlalchemy.Column("body", sqlalchemy.String),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+    # denormalised count of rows in likes, maintained by like_post
+    sqlalchemy.Column(
+        "like_count", sqlalchemy.Integer, nullable=False, server_default="0"
+    ),
+    sqlalchemy.Index("ix_posts_user_id", "user_id"),
+    # most_likes sorting and its keyset pagination walk this index
+    sqlalchemy.Index("ix_posts_like_count_id", "like_count", "id"),
 )
 
 comment_table = sqlalchemy.Table(
@@ -23,6 +33,9 @@ comment_table = sqlalchemy.Table(
     sqlalchemy.Column("body", sqlalchemy.String),
     sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), nullable=False),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+    # comments of a post come back in id order straight from the index
+    sqlalchemy.Index("ix_comments_post_id_id", "post_id", "id"),
+    sqlalchemy.Index("ix_comments_user_id", "user_id"),
 )
 
 like_table = sqlalchemy.Table(
@@ -31,6 +44,8 @@ like_table = sqlalchemy.Table(
     sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
     sqlalchemy.Column("post_id", sqlalchemy.ForeignKey("posts.id"), nullable=False),
     sqlalchemy.Column("user_id", sqlalchemy.ForeignKey("users.id"), nullable=False),
+    sqlalchemy.Index("ix_likes_post_id_user_id", "post_id", "user_id"),
+    sqlalchemy.Index("ix_likes_user_id", "user_id"),
 )
 
 user_table = sqlalchemy.Table(
@@ -42,16 +57,146 @@ user_table = sqlalchemy.Table(
     sqlalchemy.Column("confirmed", sqlalchemy.Boolean, default=False),
 )
 
+# one row per upload, files with the same content share the blob of their digest
+upload_table = sqlalchemy.Table(
+    "uploads",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("filename", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("digest", sqlalchemy.String(64), nullable=False),
+    sqlalchemy.Column("size", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column(
+        "created_at",
+        sqlalchemy.DateTime,
+        nullable=False,
+        server_default=sqlalchemy.func.current_timestamp(),
+    ),
+    sqlalchemy.Index("ix_uploads_digest", "digest"),
+)
+
+# resumable uploads in progress, the bytes received so far are in a partial file
+upload_session_table = sqlalchemy.Table(
+    "upload_sessions",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.String(32), primary_key=True),
+    sqlalchemy.Column("filename", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("size", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column(
+        "upload_offset", sqlalchemy.Integer, nullable=False, server_default="0"
+    ),
+    # unix time, pushed back by every PATCH
+    sqlalchemy.Column("expires_at", sqlalchemy.Float, nullable=False),
+    # the PATCH appending to the session, in whichever worker it runs
+    sqlalchemy.Column("claimed_by", sqlalchemy.String(32)),
+    sqlalchemy.Column("claimed_at", sqlalchemy.Float),
+    sqlalchemy.Index("ix_upload_sessions_expires_at", "expires_at"),
+)
+
+# processing of an uploaded blob, one job per digest
+media_job_table = sqlalchemy.Table(
+    "media_jobs",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("digest", sqlalchemy.String(64), nullable=False, unique=True),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    # queued, running, done or failed
+    sqlalchemy.Column("status", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("attempts", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("error", sqlalchemy.String),
+    # unix times, a retry waits until run_after
+    sqlalchemy.Column("run_after", sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column("claimed_by", sqlalchemy.String(32)),
+    sqlalchemy.Column("claimed_at", sqlalchemy.Float),
+    sqlalchemy.Index("ix_media_jobs_status_run_after", "status", "run_after"),
+)
+
+# renditions derived from an uploaded image, stored as blobs of their own
+media_table = sqlalchemy.Table(
+    "media",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("digest", sqlalchemy.String(64), nullable=False),
+    sqlalchemy.Column("preset", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("width", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("height", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("content_type", sqlalchemy.String, nullable=False),
+    sqlalchemy.Column("rendition_digest", sqlalchemy.String(64), nullable=False),
+    sqlalchemy.Column("size", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Index("ix_media_digest", "digest"),
+    sqlalchemy.Index("ix_media_rendition_digest", "rendition_digest"),
+)
+
+
+def sqlite_pragmas(config: GlobalConfig) -> tuple[str, ...]:
+    """The connection profile of GlobalConfig as PRAGMA statements."""
+    return (
+        f"PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = {config.SQLITE_CACHE_SIZE}",
+        f"PRAGMA mmap_size = {config.SQLITE_MMAP_SIZE}",
+        f"PRAGMA temp_store = {config.SQLITE_TEMP_STORE}",
+        f"PRAGMA busy_timeout = {config.SQLITE_BUSY_TIMEOUT_MS}",
+        # comment and like writes rely on it instead of looking up the post first
+        "PRAGMA foreign_keys = ON",
+    )
+
+
+class PragmaConnection(sqlite3.Connection):
+    """sqlite3 connection that configures itself when it is opened.
+
+    databases opens a new connection for every query outside a transaction,
+    so per connection settings have to be applied here.
+    """
+
+    pragmas: tuple[str, ...] = ()
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        for pragma in self.pragmas:
+            self.execute(pragma)
+
+
+def connect_options(url: str, config: GlobalConfig) -> dict:
+    if url.startswith("sqlite"):
+        factory = type(
+            "PragmaConnection", (PragmaConnection,), {"pragmas": sqlite_pragmas(config)}
+        )
+        return {"factory": factory}
+    return {}
+
+
+async def sqlite_settings(db: databases.Database) -> dict[str, str]:
+    """Reads back the settings a connection of db actually runs with."""
+    names = (
+        "journal_mode",
+        "synchronous",
+        "cache_size",
+        "mmap_size",
+        "temp_store",
+        "busy_timeout",
+        "foreign_keys",
+    )
+    return {name: await db.fetch_val(f"PRAGMA {name}") for name in names}
+
 
-engine = sqlalchemy.create_engine(
+database = InstrumentedDatabase(
     config.DATABASE_URL,
-    # make the process multithreaded
-    connect_args={"check_same_thread": False},
+    force_rollback=config.DB_FORCE_ROLL_BACK,
+    slow_query_seconds=config.DB_SLOW_QUERY_SECONDS,
+    **connect_options(config.DATABASE_URL, config),
 )
 
-metadata.create_all(engine)
-database = databases.Database(
-    config.DATABASE_URL, force_rollback=config.DB_FORCE_ROLL_BACK
+# read only queries of GET requests, the primary when no replica is configured
+read_database = (
+    InstrumentedDatabase(
+        config.READ_DATABASE_URL,
+        slow_query_seconds=config.DB_SLOW_QUERY_SECONDS,
+        **connect_options(config.READ_DATABASE_URL, config),
+    )
+    if config.READ_DATABASE_URL
+    else database
 )
 
 
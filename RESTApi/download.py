@@ -0,0 +1,142 @@
+"""Serving stored blobs with byte ranges and immutable caching.
+
+A blob never changes, so its digest is a strong ETag and clients may
+cache it forever. The body is sent with the ASGI zero copy extension
+when the server offers it, through X-Accel-Redirect when an nginx in
+front is configured for it, and read in chunks otherwise.
+"""
+
+from pathlib import Path
+
+import anyio
+from fastapi import HTTPException, Response, status
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+ZERO_COPY_SEND = "http.response.zerocopysend"
+
+
+def etag_of(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # weak comparison, as If-None-Match asks for
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+def range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Range not satisfiable.",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """The first and last byte of a single range header, None for the whole file.
+
+    Several ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    if size == 0:
+        raise range_not_satisfiable(size)
+
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # suffix range, the last n bytes
+            length = int(last)
+            if length <= 0:
+                raise range_not_satisfiable(size)
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise range_not_satisfiable(size)
+    return start, end
+
+
+class BlobResponse(Response):
+    """A whole blob or one byte range of it."""
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        media_type: str,
+        headers: dict[str, str],
+        byte_range: tuple[int, int] | None = None,
+        accel_redirect: str | None = None,
+    ) -> None:
+        self.path: Path = path
+        self.start, self.end = byte_range or (0, size - 1)
+        self.accel_redirect: str | None = accel_redirect
+        self.status_code = (
+            status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+        )
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+        if accel_redirect:
+            # nginx serves the body, and any range of it, from its internal location
+            self.headers["x-accel-redirect"] = accel_redirect
+            return
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        if byte_range:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"] == "HEAD" or self.accel_redirect:
+            await send({"type": "http.response.body", "body": b""})
+        elif ZERO_COPY_SEND in scope.get("extensions", {}):
+            # opened and closed on a worker thread, as the chunked path does
+            async with await anyio.open_file(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": ZERO_COPY_SEND,
+                        "file": file.wrapped,
+                        "offset": self.start,
+                        "count": self.end - self.start + 1,
+                    }
+                )
+        else:
+            await self.send_chunks(send)
+
+    async def send_chunks(self, send: Send) -> None:
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body", "body": b""})
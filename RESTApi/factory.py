@@ -1,16 +1,32 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+import os
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 from asgi_correlation_id import CorrelationIdMiddleware
-from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException
 from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from . import routers
-from .db import database
-from .logging_conf import configure_logging
+from .config import config
+from .db import database, read_database
+from .db.migrations import check_schema, migrate
+from .db.routing import ReadReplicaMiddleware, refresh_replica_periodically
+from .db.setup import sqlite_settings
+from .logging_conf import configure_logging, stop_logging
+from .media import media_queue
+from .metrics import (
+    MetricsMiddleware,
+    SnapshotFiles,
+    registry,
+    write_snapshots_periodically,
+)
+from .pagination import NEXT_CURSOR_HEADER
+from .resumable import collect_abandoned_uploads_periodically
+from .routers import ROUTERS
+from .security import password_pool
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -26,15 +42,9 @@ origins = [
 def create_app() -> FastAPI:
     app: FastAPI = FastAPI(lifespan=lifespan)
     app.add_middleware(CorrelationIdMiddleware)
-    # Iterate through each attribute in the routers module
-    for item in dir(routers):
-        logger.debug("item: %s", item)
-        # Get the attribute
-        attr = getattr(routers, item)
-        # Check if the attribute is an instance of APIRouter and register it
-        if isinstance(attr, APIRouter):
-            app.include_router(attr)
-            logger.debug("Router: %s registered", item)
+    app.add_middleware(ReadReplicaMiddleware)
+    for router in ROUTERS:
+        app.include_router(router)
 
     @app.exception_handler(HTTPException)
     async def http_exception_handle_logging(request, exc):
@@ -51,7 +61,11 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
+    if config.METRICS_ENABLED:
+        # outermost, so the time includes the other middleware
+        app.add_middleware(MetricsMiddleware)
     STATIC_DIR_PATH = Path(__file__).parent / "static/"
     STATIC_DIR_PATH.mkdir(parents=True, exist_ok=True)
     app.mount("/static", StaticFiles(directory=STATIC_DIR_PATH), name="static")
@@ -64,8 +78,68 @@ async def lifespan(app: FastAPI):
     # logging setup will run at startup
     # before db
     configure_logging()
-    logger.info("App initializing...")
+    logger.info("App initializing in worker %s...", os.getpid())
     await database.connect()
+    if config.DB_MIGRATE_ON_STARTUP:
+        await migrate(database)
+    else:
+        await check_schema(database)
+    if database.url.dialect == "sqlite":
+        logger.info("SQLite settings: %s", await sqlite_settings(database))
+
+    if config.MEDIA_PROCESSING:
+        media_queue.start()
+    metrics_files = SnapshotFiles(config.METRICS_DIR) if config.METRICS_DIR else None
+    # background jobs of this worker, cancelled on shutdown
+    tasks: list[asyncio.Task] = []
+    if metrics_files is not None:
+        tasks.append(
+            asyncio.create_task(
+                write_snapshots_periodically(
+                    metrics_files, config.METRICS_FLUSH_SECONDS
+                )
+            )
+        )
+    if config.UPLOAD_SESSION_GC_INTERVAL_SECONDS:
+        tasks.append(
+            asyncio.create_task(
+                collect_abandoned_uploads_periodically(
+                    config.UPLOAD_SESSION_GC_INTERVAL_SECONDS
+                )
+            )
+        )
+    if read_database is not database:
+        if config.READ_DATABASE_REFRESH_SECONDS:
+            tasks.append(
+                asyncio.create_task(
+                    refresh_replica_periodically(config.READ_DATABASE_REFRESH_SECONDS)
+                )
+            )
+        await read_database.connect()
+        logger.info(
+            "Reads of GET requests go to %s", read_database.url.obscure_password
+        )
     yield
-    logger.info("App terminating...")
+    logger.info("App terminating in worker %s...", os.getpid())
+    await media_queue.drain(config.MEDIA_DRAIN_TIMEOUT_SECONDS)
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    if read_database is not database:
+        await read_database.disconnect()
     await database.disconnect()
+    for stats in database.top_queries(5):
+        logger.info(
+            "Query %s: %s calls, %.1f ms total, %.1f ms max",
+            stats.fingerprint,
+            stats.calls,
+            stats.total_seconds * 1000,
+            stats.max_seconds * 1000,
+        )
+    password_pool.shutdown()
+    if metrics_files is not None:
+        # the last counts of this worker, its gauges are ignored once it exits
+        metrics_files.write(registry.snapshot())
+    logger.info("Worker %s drained", os.getpid())
+    stop_logging()
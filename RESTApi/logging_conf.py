@@ -1,5 +1,8 @@
 import logging
+import queue
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterable, Literal
 
 from .config import DevConfig, config
 
@@ -23,7 +26,115 @@ class EmailObfuscationFilter(logging.Filter):
         return True
 
 
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to a listener thread through a bounded queue.
+
+    The record is not formatted here, the listener's handlers do it, so
+    compiling a logged query or rendering for the console happens off the
+    event loop. When the queue is full overflow decides: "block" waits for
+    room, "drop_new" drops the record and "drop_oldest" the oldest queued one.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        overflow: Literal["block", "drop_new", "drop_oldest"] = "drop_new",
+    ) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.dropped: int = 0
+        # the handler it replaced and on which loggers, to put it back
+        self.target: logging.Handler | None = None
+        self.loggers: list[logging.Logger] = []
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the listener runs in this process, the record needs no pickling
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.overflow == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+
+
+_listeners: list[QueueListener] = []
+queue_handlers: list[BoundedQueueHandler] = []
+
+
+def enqueue_handlers(
+    loggers: Iterable[logging.Logger], maxsize: int, overflow: str
+) -> list[QueueListener]:
+    """Replaces the handlers of loggers by queue handlers feeding them.
+
+    Every handler gets one queue and listener thread, shared by the
+    loggers using it. The filters move to the queue handler, so they run
+    in the logging thread, where the correlation id is known.
+    """
+    wrapped: dict[logging.Handler, BoundedQueueHandler] = {}
+    listeners: list[QueueListener] = []
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            if handler not in wrapped:
+                queue_handler = BoundedQueueHandler(maxsize, overflow)
+                queue_handler.target = handler
+                queue_handler.filters, handler.filters = handler.filters, []
+                listener = QueueListener(
+                    queue_handler.queue, handler, respect_handler_level=True
+                )
+                listener.start()
+                wrapped[handler] = queue_handler
+                listeners.append(listener)
+            logger.removeHandler(handler)
+            logger.addHandler(wrapped[handler])
+            wrapped[handler].loggers.append(logger)
+    queue_handlers.extend(wrapped.values())
+    return listeners
+
+
+def restore_handlers(queue_handler: BoundedQueueHandler) -> None:
+    """Puts the handler queue_handler replaced back on its loggers."""
+    handler = queue_handler.target
+    if handler is None:
+        return
+    handler.filters = queue_handler.filters
+    for logger in queue_handler.loggers:
+        if queue_handler in logger.handlers:
+            logger.removeHandler(queue_handler)
+            logger.addHandler(handler)
+    queue_handler.loggers.clear()
+
+
+def stop_logging() -> None:
+    """Flushes the queued records, called last on shutdown.
+
+    The loggers get their handlers back, so what is logged after the
+    shutdown, uvicorn's last lines, is written directly instead of into
+    a queue nobody reads.
+    """
+    dropped = sum(handler.dropped for handler in queue_handlers)
+    if dropped:
+        logging.getLogger(__name__).warning("Dropped %s log records", dropped)
+    while _listeners:
+        _listeners.pop().stop()
+    for queue_handler in queue_handlers:
+        restore_handlers(queue_handler)
+    queue_handlers.clear()
+
+
 def configure_logging() -> None:
+    # the listeners and queue handlers of an earlier configuration, so
+    # configuring twice does not queue into a queue
+    stop_logging()
     dictConfig(
         {
             "version": 1,
@@ -60,7 +171,12 @@ def configure_logging() -> None:
             },
             "handlers": {
                 "default": {
-                    "class": "rich.logging.RichHandler",
+                    # rich is only imported for the dev console
+                    "class": (
+                        "rich.logging.RichHandler"
+                        if isinstance(config, DevConfig)
+                        else "logging.StreamHandler"
+                    ),
                     "level": "DEBUG",
                     "formatter": "console",
                     "filters": ["correlation_id", "email_obfuscation"],
@@ -82,8 +198,8 @@ def configure_logging() -> None:
             "loggers": {
                 "uvicorn": {"handlers": ["default", "rotating_file"], "level": "INFO"},
                 # root is the parent of all
-                # storeapi.routers.post
-                "storeapi": {
+                # RESTApi.routers.main.routers
+                "RESTApi": {
                     "handlers": ["default", "rotating_file"],
                     "level": "DEBUG" if isinstance(config, DevConfig) else "INFO",
                     # root is out
@@ -95,3 +211,20 @@ def configure_logging() -> None:
             },
         }
     )
+    _listeners.extend(
+        enqueue_handlers(
+            [
+                logging.getLogger(name)
+                for name in (
+                    "uvicorn",
+                    "uvicorn.access",
+                    "uvicorn.error",
+                    "RESTApi",
+                    "databases",
+                    "aiosqlite",
+                )
+            ],
+            maxsize=config.LOG_QUEUE_SIZE,
+            overflow=config.LOG_QUEUE_OVERFLOW,
+        )
+    )
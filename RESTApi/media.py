@@ -0,0 +1,254 @@
+"""Background processing of uploaded images.
+
+Jobs are rows of media_jobs, so they survive restarts and every app
+worker can pick them up. A worker claims a job by writing a fresh token to
+it, runs process_image in its process pool, so the event loop never
+does the work, and records the renditions in the media table.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import suppress
+from typing import Callable
+
+import databases
+import sqlalchemy
+
+from . import storage
+from .config import config
+from .db import database, media_job_table, media_table
+from .media_processing import process_image
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def is_processable(content_type: str) -> bool:
+    return content_type.startswith("image/") and content_type != "image/svg+xml"
+
+
+def retry_delay(attempts: int) -> float:
+    return min(2**attempts, 300)
+
+
+class MediaQueue:
+    """Runs the media jobs of the database on a pool of processes.
+
+    At most workers jobs run at once. drain stops taking new jobs and
+    waits for the running ones, a job it gives up on is queued again.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        poll_interval: float,
+        job_timeout: float,
+        executor_factory: Callable[[int], Executor] | None = None,
+        db: databases.Database = database,
+    ) -> None:
+        self.workers: int = workers
+        self.max_attempts: int = max_attempts
+        self.poll_interval: float = poll_interval
+        self.job_timeout: float = job_timeout
+        self.db: databases.Database = db
+        self.completed: int = 0
+        self.failed: int = 0
+        self._executor_factory = executor_factory or self._process_pool
+        self._executor: Executor | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _process_pool(workers: int) -> Executor:
+        # not forked, the app process has threads and open connections
+        return ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._executor_factory(self.workers)
+        return self._executor
+
+    async def enqueue(self, digest: str, content_type: str) -> None:
+        """Queues processing of a blob, once per digest."""
+        if not is_processable(content_type):
+            return
+        query = (
+            media_job_table.insert()
+            .prefix_with("OR IGNORE")
+            .values(
+                digest=digest,
+                content_type=content_type,
+                status=QUEUED,
+                attempts=0,
+                run_after=time.time(),
+            )
+        )
+        await self.db.execute(query)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def claim(self):
+        """Takes the next due job, or one abandoned by a dead worker."""
+        now = time.time()
+        job = media_job_table.c
+        due = (
+            sqlalchemy.select(job.id)
+            .where(
+                sqlalchemy.or_(
+                    sqlalchemy.and_(job.status == QUEUED, job.run_after <= now),
+                    sqlalchemy.and_(
+                        job.status == RUNNING,
+                        job.claimed_at < now - self.job_timeout,
+                    ),
+                )
+            )
+            .order_by(job.run_after)
+            .limit(1)
+            .scalar_subquery()
+        )
+        claim_token = uuid.uuid4().hex
+        await self.db.execute(
+            media_job_table.update()
+            .where(job.id == due)
+            .values(
+                status=RUNNING,
+                attempts=job.attempts + 1,
+                claimed_by=claim_token,
+                claimed_at=now,
+            )
+        )
+        return await self.db.fetch_one(
+            media_job_table.select().where(job.claimed_by == claim_token)
+        )
+
+    async def run_job(self, job) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(),
+                process_image,
+                str(storage.blob_path(job.digest)),
+                str(storage.UPLOAD_DIRECTORY),
+            )
+            rows = [{"digest": job.digest, **row} for row in result["renditions"]]
+            async with self.db.transaction():
+                await self.db.execute(
+                    media_table.delete().where(media_table.c.digest == job.digest)
+                )
+                await self.db.execute_many(media_table.insert(), rows)
+                await self._update(job, status=DONE, error=None)
+        except asyncio.CancelledError:
+            await self._release(job)
+            raise
+        except Exception as e:
+            await self._failed(job, e)
+            return
+
+        self.completed += 1
+        logger.info(
+            "Processed %s (%sx%s)", job.digest, result["width"], result["height"]
+        )
+
+    async def _update(self, job, **values) -> None:
+        await self.db.execute(
+            media_job_table.update()
+            .where(media_job_table.c.id == job.id)
+            .where(media_job_table.c.claimed_by == job.claimed_by)
+            .values(claimed_by=None, claimed_at=None, **values)
+        )
+
+    async def _failed(self, job, error: Exception) -> None:
+        logger.warning("Media job %s failed: %r", job.digest, error)
+        if job.attempts >= self.max_attempts:
+            self.failed += 1
+            await self._update(job, status=FAILED, error=repr(error))
+        else:
+            await self._update(
+                job,
+                status=QUEUED,
+                error=repr(error),
+                run_after=time.time() + retry_delay(job.attempts),
+            )
+
+    async def _release(self, job) -> None:
+        # interrupted by the drain, does not count as an attempt
+        await self._update(
+            job, status=QUEUED, attempts=job.attempts - 1, run_after=time.time()
+        )
+
+    async def process_next(self) -> bool:
+        """Claims and runs one job, False when none was due."""
+        job = await self.claim()
+        if job is None:
+            return False
+        await self.run_job(job)
+        return True
+
+    async def _run(self) -> None:
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            # cleared before claiming, so an enqueue meanwhile is not missed
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception:
+                logger.exception("Claiming a media job failed")
+                job = None
+            if job is None:
+                slots.release()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                continue
+
+            task = asyncio.create_task(self.run_job(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    async def drain(self, timeout: float) -> None:
+        """Stops claiming jobs and gives the running ones timeout seconds."""
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        pending: set[asyncio.Task] = set()
+        if self._running:
+            logger.info("Waiting for %s media jobs", len(self._running))
+            _, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._executor is not None:
+            # a process still busy with a given up job finishes it and exits
+            self._executor.shutdown(wait=not pending, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+media_queue = MediaQueue(
+    workers=config.MEDIA_WORKERS,
+    max_attempts=config.MEDIA_JOB_MAX_ATTEMPTS,
+    poll_interval=config.MEDIA_POLL_SECONDS,
+    job_timeout=config.MEDIA_JOB_TIMEOUT_SECONDS,
+)
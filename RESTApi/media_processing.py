@@ -0,0 +1,77 @@
+"""CPU bound image work, run in the processes of the media queue.
+
+Only plain arguments go in and out, the functions run in a spawned
+interpreter without the app's state.
+"""
+
+import hashlib
+import io
+import os
+import uuid
+from pathlib import Path
+
+from .storage import blob_relative_path
+
+# longest side in pixels, None keeps the original size
+PRESETS: dict[str, int | None] = {
+    "thumbnail": 256,
+    "medium": 1024,
+    # the original re-encoded without its EXIF, XMP and ICC metadata
+    "stripped": None,
+}
+
+
+def write_blob(data: bytes, upload_directory: Path) -> str:
+    """Stores data under its digest, the sync twin of storage.BlobWriter."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = upload_directory / blob_relative_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{digest}.{uuid.uuid4().hex}.part")
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    return digest
+
+
+def encode(image) -> tuple[bytes, str]:
+    """The image as PNG when it has transparency, else as JPEG.
+
+    Nothing but the pixels is written, which strips the metadata.
+    """
+    buffer = io.BytesIO()
+    if "A" in image.getbands() or "transparency" in image.info:
+        image.convert("RGBA").save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    image.convert("RGB").save(buffer, "JPEG", quality=85, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def process_image(
+    source: str, upload_directory: str, presets: dict[str, int | None] = PRESETS
+) -> dict:
+    """Dimensions of the image at source and a rendition per preset."""
+    from PIL import Image, ImageOps
+
+    directory = Path(upload_directory)
+    with Image.open(source) as opened:
+        # rotate as the camera meant before the orientation tag is dropped
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    renditions = []
+    for preset, max_side in presets.items():
+        rendition = image.copy()
+        if max_side:
+            rendition.thumbnail((max_side, max_side))
+        data, content_type = encode(rendition)
+        renditions.append(
+            {
+                "preset": preset,
+                "width": rendition.width,
+                "height": rendition.height,
+                "content_type": content_type,
+                "rendition_digest": write_blob(data, directory),
+                "size": len(data),
+            }
+        )
+    return {"width": image.width, "height": image.height, "renditions": renditions}
@@ -0,0 +1,279 @@
+"""In-process metrics in the Prometheus text format.
+
+Every worker counts into its own Registry. With METRICS_DIR set each
+one also writes a snapshot file there, /metrics adds the snapshots of all
+workers up, counters and histograms of exited workers included, gauges
+only of the live ones.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# any other method is counted as "other", the label count stays bounded
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE")
+)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labels: tuple[str, ...] = labels
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def samples(self) -> list:
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def clear(self) -> None:
+        self.values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, *labels: str, value: float) -> None:
+        """For a total counted elsewhere, set by a collector."""
+        self.values[labels] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        self.values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """Fixed buckets, a value is [count per bucket..., +Inf count, sum]."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets: tuple[float, ...] = buckets
+        self.values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: tuple[str, ...] = (), **kwargs
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, **kwargs))
+
+    def collector(self, func: Callable[[], None]) -> Callable[[], None]:
+        """Registers func to refresh gauges right before a snapshot."""
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self) -> dict:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("Metrics collector %s failed", collect.__name__)
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                metric.name: {
+                    "type": metric.type,
+                    "help": metric.help,
+                    "labels": list(metric.labels),
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": metric.samples(),
+                }
+                for metric in self.metrics.values()
+            },
+        }
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(snapshots: Iterable[dict]) -> dict:
+    """Sums the samples of snapshots, gauges of dead processes left out."""
+    merged: dict = {}
+    for snapshot in snapshots:
+        alive = snapshot["pid"] == os.getpid() or pid_alive(snapshot["pid"])
+        for name, metric in snapshot["metrics"].items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "values": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    current = target["values"].get(key, [0] * len(value))
+                    target["values"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["values"][key] = target["values"].get(key, 0) + value
+    return merged
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{n}="{escape(str(v))}"' for n, v in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def render(merged: dict) -> str:
+    """The Prometheus text exposition format, version 0.0.4."""
+    lines: list[str] = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+        for key, value in sorted(metric["values"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{format_labels(names, key)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], "+Inf"], value[:-1]):
+                cumulative += count
+                labels = format_labels([*names, "le"], [*key, bound])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(names, key)} {value[-1]}")
+            lines.append(f"{name}_count{format_labels(names, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class SnapshotFiles:
+    """The per process snapshot files of a directory shared by the workers."""
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory: Path = Path(directory)
+
+    def write(self, snapshot: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{snapshot['pid']}.json"
+        partial = path.with_suffix(".part")
+        partial.write_text(json.dumps(snapshot))
+        os.replace(partial, path)
+
+    def read(self) -> list[dict]:
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable metrics file %s", path)
+        return snapshots
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total",
+    "Requests handled, by route template and status.",
+    ("method", "route", "status"),
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to the last byte of the response, by route template.",
+    ("method", "route"),
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests being handled right now."
+)
+
+
+class MetricsMiddleware:
+    """Counts every http request under the template of its route.
+
+    FastAPI stores the matched route in the scope, the template keeps the
+    label count bounded, unmatched paths share one label.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+            http_requests.inc(method, template, str(status_code))
+            http_latency.observe(method, template, value=time.perf_counter() - start)
+
+
+async def write_snapshots_periodically(files: SnapshotFiles, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(files.write, registry.snapshot())
+        except OSError:
+            logger.exception("Writing the metrics snapshot failed")
@@ -41,3 +41,12 @@ class PostLikeIn(BaseModel):
 class PostLike(PostLikeIn):
     id: int
     user_id: int
+
+
+class BulkItemResult(BaseModel):
+    """Outcome of one item of a bulk request, index is its position in the request."""
+
+    index: int
+    status_code: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
@@ -0,0 +1,53 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class Upload(BaseModel):
+    id: int
+    filename: str
+    digest: str
+    size: int
+    content_type: str
+    file_url: str
+
+
+class UploadOut(Upload):
+    detail: str
+    # False when the content was already stored by an earlier upload
+    created: bool
+
+
+class UploadSessionIn(BaseModel):
+    filename: str
+    size: int = Field(ge=0)
+    content_type: Optional[str] = None
+
+
+class UploadSession(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: str
+    filename: str
+    content_type: str
+    size: int
+    upload_offset: int
+    expires_at: float
+
+
+class MediaRendition(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    preset: str
+    width: int
+    height: int
+    content_type: str
+    size: int
+    file_url: str
+
+
+class MediaStatus(BaseModel):
+    digest: str
+    # queued, running, done or failed
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    renditions: list[MediaRendition] = []
@@ -0,0 +1,32 @@
+import base64
+import binascii
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sorting: str, key: list) -> str:
+    """Pack the sort key of the last row of a page into an opaque string."""
+    raw = json.dumps({"s": sorting, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sorting: str, length: int | None = None) -> list:
+    """Unpack a cursor made by encode_cursor, whose key has length values.
+
+    Raises ValueError if the cursor is malformed or was issued for another sorting.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+
+    if not isinstance(data, dict) or data.get("s") != sorting:
+        raise ValueError("Cursor does not match sorting")
+    key = data.get("k")
+    if not isinstance(key, list) or not all(type(value) is int for value in key):
+        raise ValueError("Malformed cursor")
+    if length is not None and len(key) != length:
+        raise ValueError("Malformed cursor")
+    return key
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when no worker became free within the queue timeout."""
+
+
+class _Slots(ABC):
+    """At most limit holders at once, others wait for a slot for up to
+    queue_timeout seconds before PoolSaturatedError.
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout: float) -> None:
+        self.name: str = name
+        self.limit: int = limit
+        self.queue_timeout: float = queue_timeout
+        self.in_flight: int = 0
+        self.waiting: int = 0
+        self.rejected: int = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to one loop, tests run several
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def _acquire(self) -> asyncio.Semaphore:
+        """Takes a slot, returns the semaphore to hand to _release."""
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            if semaphore.locked() and self.queue_timeout <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(semaphore.acquire(), max(self.queue_timeout, 0.001))
+        except asyncio.TimeoutError as e:
+            self.rejected += 1
+            logger.warning("%s saturated: %s", self.name, self.stats())
+            raise PoolSaturatedError(self.name) from e
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return semaphore
+
+    def _release(self, semaphore: asyncio.Semaphore) -> None:
+        self.in_flight -= 1
+        semaphore.release()
+
+    @abstractmethod
+    def stats(self) -> dict[str, int]:
+        """Counters for /metrics, logged when saturated."""
+
+
+class BoundedThreadPool(_Slots):
+    """Runs blocking calls on a dedicated thread pool from async code.
+
+    At most max_workers calls run at the same time, the others wait for a
+    free worker for up to queue_timeout seconds before PoolSaturatedError.
+    """
+
+    def __init__(self, name: str, max_workers: int, queue_timeout: float) -> None:
+        super().__init__(name, max_workers, queue_timeout)
+        self.max_workers: int = max_workers
+        self.completed: int = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        semaphore = await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.completed += 1
+            self._release(semaphore)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class ConcurrencyLimit(_Slots):
+    """Caps how many requests run a section at the same time.
+
+    Callers wait for a slot for up to queue_timeout seconds before
+    PoolSaturatedError.
+    """
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        semaphore = await self._acquire()
+        try:
+            yield
+        finally:
+            self._release(semaphore)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
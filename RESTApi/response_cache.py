@@ -0,0 +1,194 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Protocol
+
+from fastapi import Response
+
+from .cache import TTLCache
+from .config import config
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """An already serialized JSON response, a hit is sent as is."""
+
+    body: bytes
+    headers: dict[str, str] = field(default_factory=dict)
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.headers).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        headers, body = data.split(b"\n", 1)
+        return cls(body=body, headers=json.loads(headers))
+
+    def to_response(self) -> Response:
+        return Response(
+            content=self.body, headers=self.headers, media_type="application/json"
+        )
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str]) -> None: ...
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None: ...
+
+    async def invalidated_at(self) -> float: ...
+
+    async def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """Per process LRU, tags map to the keys stored under them."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._tags: dict[str, set[str]] = {}
+        self._invalidated_at: float = 0
+
+    async def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        self._cache.set(key, value)
+        for tag in tags:
+            keys = self._tags.setdefault(tag, set())
+            keys.add(key)
+            # keys evicted by the LRU are only dropped from a tag on invalidation
+            if len(keys) > 2 * self._cache.maxsize:
+                keys.intersection_update([k for k in keys if k in self._cache])
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        self._invalidated_at = time.time()
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self._cache.invalidate(key)
+
+    async def invalidated_at(self) -> float:
+        return self._invalidated_at
+
+    async def clear(self) -> None:
+        self._cache.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+
+class RedisBackend:
+    """Shared between processes, a tag is a redis set of the keys stored under it."""
+
+    def __init__(self, client, ttl: float, prefix: str = "response:") -> None:
+        self._client = client
+        self._ttl: int = max(1, int(ttl))
+        self._prefix: str = prefix
+
+    @classmethod
+    def from_url(cls, url: str, ttl: float) -> "RedisBackend":
+        from redis import asyncio as aioredis
+
+        return cls(aioredis.from_url(url), ttl)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self._prefix}tag:{tag}"
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        await self._client.set(self._prefix + key, value, ex=self._ttl)
+        for tag in tags:
+            await self._client.sadd(self._tag_key(tag), self._prefix + key)
+            await self._client.expire(self._tag_key(tag), self._ttl)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        keys = set()
+        for tag_key in tag_keys:
+            keys.update(await self._client.smembers(tag_key))
+        await self._client.delete(*keys, *tag_keys)
+        # no expiry, a replica copy older than it must never be cached
+        await self._client.set(self._prefix + "invalidated_at", str(time.time()))
+
+    async def invalidated_at(self) -> float:
+        value = await self._client.get(self._prefix + "invalidated_at")
+        return float(value) if value is not None else 0
+
+    async def clear(self) -> None:
+        keys = [key async for key in self._client.scan_iter(f"{self._prefix}*")]
+        if keys:
+            await self._client.delete(*keys)
+
+
+class ResponseCache:
+    """Pre-serialized responses keyed by route and parameters.
+
+    Every entry is stored under tags, writes invalidate the tags they affect.
+    A cache without a backend stores nothing.
+    """
+
+    def __init__(self, backend: CacheBackend | None) -> None:
+        self.backend: CacheBackend | None = backend
+
+    async def get(self, key: str) -> Response | None:
+        if self.backend is None:
+            return None
+        data = await self.backend.get(key)
+        if data is None:
+            return None
+        return CachedResponse.from_bytes(data).to_response()
+
+    async def set(
+        self,
+        key: str,
+        body: bytes,
+        tags: Iterable[str],
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        """Store the body and return it as a response."""
+        cached = CachedResponse(body=body, headers=headers or {})
+        if self.backend is not None:
+            await self.backend.set(key, cached.to_bytes(), tags)
+        return cached.to_response()
+
+    async def invalidate(self, *tags: str) -> None:
+        if self.backend is not None:
+            logger.debug("Invalidating cached responses tagged %s", tags)
+            await self.backend.invalidate_tags(tags)
+
+    async def invalidated_at(self) -> float:
+        """When a write last invalidated entries, in any worker sharing the backend."""
+        if self.backend is None:
+            return 0
+        return await self.backend.invalidated_at()
+
+    async def clear(self) -> None:
+        if self.backend is not None:
+            await self.backend.clear()
+
+
+def create_response_cache(
+    backend: str, max_size: int, ttl: float, redis_url: str | None = None
+) -> ResponseCache:
+    if backend == "memory":
+        return ResponseCache(MemoryBackend(maxsize=max_size, ttl=ttl))
+    if backend == "redis":
+        if not redis_url:
+            raise ValueError("REDIS_URL is required for the redis response cache")
+        return ResponseCache(RedisBackend.from_url(redis_url, ttl=ttl))
+    return ResponseCache(None)
+
+
+response_cache = create_response_cache(
+    config.RESPONSE_CACHE_BACKEND,
+    max_size=config.RESPONSE_CACHE_MAX_SIZE,
+    ttl=config.RESPONSE_CACHE_TTL_SECONDS,
+    redis_url=config.REDIS_URL,
+)
@@ -0,0 +1,263 @@
+"""Resumable uploads, modelled on the tus protocol.
+
+A session is created with the final size, its bytes are appended by PATCH
+requests at the offset the server reports, and it is moved to its content
+address once complete. The offset lives in the upload_sessions table and
+the data in PARTIAL_DIRECTORY/<session id>, so an upload survives a
+worker restart. A PATCH claims its session in the table before writing,
+so two PATCHes on different workers cannot write the same file.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import databases
+import sqlalchemy
+from fastapi import HTTPException, status
+
+from . import storage
+from .config import config
+from .db import database, upload_session_table
+from .storage import CHUNK_SIZE, StoredBlob, move_to_blob
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def partial_path(session_id: str) -> Path:
+    return storage.PARTIAL_DIRECTORY / session_id
+
+
+def session_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found."
+    )
+
+
+async def create_session(filename: str, size: int, content_type: str) -> dict:
+    session = {
+        "id": uuid.uuid4().hex,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "upload_offset": 0,
+        "expires_at": time.time() + config.UPLOAD_SESSION_TTL_SECONDS,
+    }
+    storage.PARTIAL_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    partial_path(session["id"]).touch()
+    await database.execute(upload_session_table.insert().values(session))
+    logger.debug("Created upload session %s", session["id"])
+    return session
+
+
+async def get_session(session_id: str):
+    query = upload_session_table.select().where(
+        upload_session_table.c.id == session_id,
+        upload_session_table.c.expires_at > time.time(),
+    )
+    session = await database.fetch_one(query)
+    if session is None:
+        raise session_not_found()
+    return session
+
+
+def offset_conflict(upload_offset: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Upload-Offset must be {upload_offset}.",
+        headers={"Upload-Offset": str(upload_offset)},
+    )
+
+
+def append_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Another request is appending to this upload.",
+    )
+
+
+def unclaimed(now: float):
+    """Sessions no PATCH is appending to, or whose PATCH died."""
+    session = upload_session_table.c
+    return sqlalchemy.or_(
+        session.claimed_by.is_(None),
+        session.claimed_at < now - config.UPLOAD_PATCH_TIMEOUT_SECONDS,
+    )
+
+
+async def claim(session, offset: int) -> str:
+    """Takes the session for one PATCH at offset, returns the claim token.
+
+    The offset check and the claim are one UPDATE, so of two PATCHes
+    racing on different workers only one gets the session.
+    """
+    if offset != session.upload_offset:
+        raise offset_conflict(session.upload_offset)
+
+    now = time.time()
+    claim_token = uuid.uuid4().hex
+    await database.execute(
+        upload_session_table.update()
+        .where(
+            upload_session_table.c.id == session.id,
+            upload_session_table.c.upload_offset == offset,
+            unclaimed(now),
+        )
+        .values(claimed_by=claim_token, claimed_at=now)
+    )
+    claimed = await database.fetch_one(
+        upload_session_table.select().where(
+            upload_session_table.c.id == session.id,
+            upload_session_table.c.claimed_by == claim_token,
+        )
+    )
+    if claimed is None:
+        current = await get_session(session.id)
+        if current.upload_offset != offset:
+            raise offset_conflict(current.upload_offset)
+        raise append_conflict()
+    return claim_token
+
+
+async def release(session_id: str, claim_token: str, offset: int, new_offset: int):
+    """Records new_offset and gives the session back, raises a 409 when
+    the claim was taken over meanwhile.
+    """
+    session = upload_session_table.c
+    await database.execute(
+        upload_session_table.update()
+        .where(
+            session.id == session_id,
+            session.claimed_by == claim_token,
+            session.upload_offset == offset,
+        )
+        .values(
+            upload_offset=new_offset,
+            claimed_by=None,
+            claimed_at=None,
+            expires_at=time.time() + config.UPLOAD_SESSION_TTL_SECONDS,
+        )
+    )
+    released = await database.fetch_one(
+        upload_session_table.select().where(
+            session.id == session_id,
+            session.upload_offset == new_offset,
+            session.claimed_by.is_(None),
+        )
+    )
+    if released is None:
+        raise append_conflict()
+
+
+async def append(
+    session, offset: int, chunks: AsyncIterator[bytes]
+) -> tuple[int, StoredBlob | None]:
+    """Writes chunks at offset, returns the new offset and, once the last
+    byte arrived, the blob the session was moved to.
+
+    The offset must be the one of the session, bytes past a previous
+    interrupted PATCH are overwritten. What was received before the
+    client went away is kept, so it can resume from there. A complete
+    session is finalized before its claim is given back, so a retried
+    last PATCH gets a 409 or 404 instead of finalizing it twice.
+    """
+    import aiofiles
+
+    claim_token = await claim(session, offset)
+    new_offset = offset
+    blob = None
+    try:
+        async with aiofiles.open(partial_path(session.id), "r+b") as f:
+            await f.seek(offset)
+            await f.truncate()
+            async for chunk in chunks:
+                if new_offset + len(chunk) > session.size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Upload larger than its Upload-Length {session.size}.",
+                    )
+                await f.write(chunk)
+                new_offset += len(chunk)
+        if new_offset == session.size:
+            blob = await finalize(session)
+    finally:
+        # finalize deleted the session, the claim went with it
+        if blob is None:
+            await release(session.id, claim_token, offset, new_offset)
+    return new_offset, blob
+
+
+async def hash_partial(session_id: str) -> str:
+    import aiofiles
+
+    digest = hashlib.sha256()
+    async with aiofiles.open(partial_path(session_id), "rb") as f:
+        while chunk := await f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def finalize(session) -> StoredBlob:
+    """Moves a complete session to its blob and forgets the session.
+
+    Only called by append, while it holds the claim of the session.
+    """
+    digest = await hash_partial(session.id)
+    created = move_to_blob(partial_path(session.id), digest)
+    await delete_session(session.id)
+    return StoredBlob(digest, session.size, session.content_type, created=created)
+
+
+async def delete_session(session_id: str) -> None:
+    await database.execute(
+        upload_session_table.delete().where(upload_session_table.c.id == session_id)
+    )
+    partial_path(session_id).unlink(missing_ok=True)
+
+
+async def collect_abandoned_uploads(
+    db: databases.Database = database, now: float | None = None
+) -> int:
+    """Deletes the expired sessions and the partial files nothing refers to.
+
+    A partial file without a session is left by a streamed upload that
+    died mid way, it is only removed once older than the session ttl.
+    Returns the number of files removed.
+    """
+    now = time.time() if now is None else now
+    # a session with a PATCH running, in any worker, is kept
+    await db.execute(
+        upload_session_table.delete().where(
+            upload_session_table.c.expires_at <= now, unclaimed(now)
+        )
+    )
+    if not storage.PARTIAL_DIRECTORY.exists():
+        return 0
+
+    live_query = sqlalchemy.select(upload_session_table.c.id)
+    live = {row.id for row in await db.fetch_all(live_query)}
+    removed = 0
+    for path in storage.PARTIAL_DIRECTORY.iterdir():
+        if path.name in live:
+            continue
+        if path.stat().st_mtime > now - config.UPLOAD_SESSION_TTL_SECONDS:
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+
+    if removed:
+        logger.info("Removed %s abandoned partial uploads", removed)
+    return removed
+
+
+async def collect_abandoned_uploads_periodically(interval: float) -> None:
+    while True:
+        try:
+            await collect_abandoned_uploads()
+        except Exception:
+            logger.exception("Collecting abandoned uploads failed")
+        await asyncio.sleep(interval)
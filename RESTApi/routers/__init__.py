@@ -1,3 +1,7 @@
 from .main import router as mainer
+from .metrics import router as metricser
 from .upload import router as uploader
 from .user import router as userer
+
+# registered by create_app in this order
+ROUTERS = (mainer, uploader, userer, metricser)
@@ -1,20 +1,28 @@
 import logging
+import sqlite3
+from collections import Counter
 from enum import Enum
 from typing import Annotated
 
 import sqlalchemy
-from fastapi import Depends, HTTPException, status
+from fastapi import Body, Depends, HTTPException, Query, status
 
 from RESTApi.models.post import (
+    BulkItemResult,
     Comment,
     CommentIn,
     PostLike,
     PostLikeIn,
     UserPostWithComments,
+    UserPostWithLikes,
 )
+from RESTApi.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from RESTApi.response_cache import response_cache
 from RESTApi.security import get_current_user
+from RESTApi.serialization import dump_row, dump_rows, fields
 
 from ...db import comment_table, database, like_table, post_table
+from ...db.routing import reader, replica_synced_since
 from ...models import User, UserPost, UserPostIn
 from . import router
 
@@ -25,18 +33,68 @@ from . import router
 
 logger: logging.Logger = logging.getLogger(__name__)
 
-select_post_and_likes = (
-    sqlalchemy.select(post_table, sqlalchemy.func.count(like_table.c.id).label("likes"))
-    .select_from(post_table.outerjoin(like_table))
-    .group_by(post_table.c.id)
-)
+# the rows are dumped as is, the queries select exactly these fields
+POST_FIELDS = fields(UserPost)
+POST_WITH_LIKES_FIELDS = fields(UserPostWithLikes)
+COMMENT_FIELDS = fields(Comment)
 
 
-async def find_post(post_id: int):
-    logger.info("Finding post with id:%s", post_id)
-    query = post_table.select().where(post_table.c.id == post_id)
-    logger.debug(query)
-    return await database.fetch_one(query)
+# cached responses are tagged so that writes invalidate only what they change
+def posts_tag(sorting: "PostSorting") -> str:
+    return f"posts:{sorting.value}"
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def comments_tag(post_id: int) -> str:
+    return f"post:{post_id}:comments"
+
+
+async def cache_reader():
+    """The database a response about to be cached is read from.
+
+    The replica, unless its last copy is older than the last invalidation:
+    a write it misses would be cached for the whole ttl, the primary is
+    read then. A replica synced by something else has an unknown lag,
+    with the cache on it is not read at all.
+    """
+    db = reader()
+    if db is database or response_cache.backend is None:
+        return db
+    if replica_synced_since(await response_cache.invalidated_at()):
+        return db
+    return database
+
+
+# likes are read from the counter maintained by like_post,
+# the likes table is only scanned by reconcile_like_counts
+select_post_and_likes = sqlalchemy.select(
+    post_table.c.id,
+    post_table.c.body,
+    post_table.c.user_id,
+    post_table.c.like_count.label("likes"),
+)
+
+# the post, its likes and its comments as a json array in one statement,
+# the comments in the field order of Comment so the array is sent as is
+select_post_with_comments = select_post_and_likes.add_columns(
+    sqlalchemy.select(
+        sqlalchemy.func.json_group_array(
+            sqlalchemy.func.json_object(
+                *(
+                    item
+                    for name in COMMENT_FIELDS
+                    for item in (name, comment_table.c[name])
+                )
+            )
+        )
+    )
+    .where(comment_table.c.post_id == post_table.c.id)
+    .scalar_subquery()
+    .label("comments")
+)
 
 
 @router.post("/post", response_model=UserPost, status_code=status.HTTP_201_CREATED)
@@ -49,6 +107,7 @@ async def create_post(
     query = post_table.insert().values(data)
     logger.debug(query)
     last_record_id = await database.execute(query)
+    await response_cache.invalidate(*(posts_tag(sorting) for sorting in PostSorting))
     return {**data, "id": last_record_id}
 
 
@@ -58,21 +117,87 @@ class PostSorting(str, Enum):
     most_likes: str = "most_likes"
 
 
-@router.get("/post", response_model=list[UserPost])
-async def get_all_posts(sorting: PostSorting = PostSorting.new):
-    logger.info("Getting all posts.")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
 
+def post_sort_key(sorting: PostSorting, post) -> list[int]:
+    if sorting == PostSorting.most_likes:
+        return [post.likes, post.id]
+    return [post.id]
+
+
+def sort_key_length(sorting: PostSorting) -> int:
+    return 2 if sorting == PostSorting.most_likes else 1
+
+
+def select_posts_page(sorting: PostSorting, limit: int, after: list[int] | None = None):
+    """Keyset pagination: every page is an index range scan that starts right
+    after the sort key of the previous page, so deep pages cost the same as the first.
+    """
     if sorting == PostSorting.new:
         query = select_post_and_likes.order_by(post_table.c.id.desc())
+        if after:
+            query = query.where(post_table.c.id < after[0])
     elif sorting == PostSorting.old:
         query = select_post_and_likes.order_by(post_table.c.id.asc())
+        if after:
+            query = query.where(post_table.c.id > after[0])
     elif sorting == PostSorting.most_likes:
+        # id breaks the ties between posts with the same number of likes
         query = select_post_and_likes.order_by(
-            sqlalchemy.desc(sqlalchemy.text("likes"))
+            post_table.c.like_count.desc(), post_table.c.id.desc()
         )
+        if after:
+            query = query.where(
+                sqlalchemy.tuple_(post_table.c.like_count, post_table.c.id)
+                < sqlalchemy.tuple_(*after)
+            )
+
+    return query.limit(limit)
 
+
+@router.get("/post", response_model=list[UserPost])
+async def get_all_posts(
+    sorting: PostSorting = PostSorting.new,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
+    """Returns one page of posts, the cursor of the next page
+    is sent in the X-Next-Cursor header when there are more posts.
+    """
+    logger.info("Getting all posts.")
+    cache_key = f"/post?sorting={sorting.value}&limit={limit}&cursor={cursor or ''}"
+    if cached := await response_cache.get(cache_key):
+        return cached
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sorting.value, sort_key_length(sorting))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor."
+            ) from e
+
+    # one extra row tells us whether there is a next page
+    query = select_posts_page(sorting, limit + 1, after)
     logger.debug(query)
-    return await database.fetch_all(query)
+    db = await cache_reader()
+    posts = await db.fetch_all(query)
+
+    headers = {}
+    if len(posts) > limit:
+        posts = posts[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            sorting.value, post_sort_key(sorting, posts[-1])
+        )
+    return await response_cache.set(
+        cache_key,
+        dump_rows(posts, POST_FIELDS),
+        tags=[posts_tag(sorting)],
+        headers=headers,
+    )
 
 
 @router.post("/comment", response_model=Comment, status_code=status.HTTP_201_CREATED)
@@ -80,17 +205,21 @@ async def create_comment(
     comment: CommentIn, current_user: Annotated[User, Depends(get_current_user)]
 ):
     logger.info("Creating a comment")
-    post = await find_post(comment.post_id)
-    if not post:
-        logging.error("Post with id %s not found", comment.post_id)
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Post not found."
-        )
     data = {**comment.model_dump(), "user_id": current_user.id}
     query = comment_table.insert().values(data)
     logger.debug(query)
 
-    last_record_id = await database.execute(query)
+    # the foreign key on post_id replaces a lookup of the post
+    try:
+        last_record_id = await database.execute(query)
+    except sqlite3.IntegrityError as e:
+        logging.error("Post with id %s not found", comment.post_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Post not found."
+        ) from e
+    await response_cache.invalidate(
+        post_tag(comment.post_id), comments_tag(comment.post_id)
+    )
     return {**data, "id": last_record_id}
 
 
@@ -104,9 +233,17 @@ async def get_comments_on_post(post_id: int):
     # return [
     #     comment for comment in comment_table.values() if comment["post_id"] == post_id
     # ]
+    cache_key = f"/post/{post_id}/comment"
+    if cached := await response_cache.get(cache_key):
+        return cached
+
     query = comment_table.select().where(comment_table.c.post_id == post_id)
     logger.debug(query)
-    return await database.fetch_all(query)
+    db = await cache_reader()
+    comments = await db.fetch_all(query)
+    return await response_cache.set(
+        cache_key, dump_rows(comments, COMMENT_FIELDS), tags=[comments_tag(post_id)]
+    )
 
 
 @router.get(
@@ -116,16 +253,31 @@ async def get_comments_on_post(post_id: int):
 )
 async def get_post_with_comments(post_id: int):
     logger.info("Getting post and its comments")
-    query = select_post_and_likes.where(post_table.c.id == post_id)
+    cache_key = f"/post/{post_id}"
+    if cached := await response_cache.get(cache_key):
+        return cached
+
+    query = select_post_with_comments.where(post_table.c.id == post_id)
     logger.debug(query)
-    post = await database.fetch_one(query)
+    db = await cache_reader()
+    post = await db.fetch_one(query)
     if not post:
         logging.error("Post with post_id: %s, not found", post_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
         )
 
-    return {"post": post, "comments": await get_comments_on_post(post_id)}
+    # the shape of UserPostWithComments
+    body = b"".join(
+        (
+            b'{"post":',
+            dump_row(post, POST_WITH_LIKES_FIELDS),
+            b',"comments":',
+            post.comments.encode(),
+            b"}",
+        )
+    )
+    return await response_cache.set(cache_key, body, tags=[post_tag(post_id)])
 
 
 @router.post("/like", response_model=PostLike, status_code=status.HTTP_201_CREATED)
@@ -134,16 +286,171 @@ async def like_post(
 ):
     logger.info("Liking post")
 
-    post: UserPost | None = await find_post(like.post_id)
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
-        )
     data = {**like.model_dump(), "user_id": current_user.id}
     query = like_table.insert().values(data)
+    counter_query = (
+        post_table.update()
+        .where(post_table.c.id == like.post_id)
+        .values(like_count=post_table.c.like_count + 1)
+    )
 
     logger.debug(query)
 
-    last_record_id = await database.execute(query)
+    # the like and its counter are written together or not at all,
+    # the foreign key on post_id replaces a lookup of the post
+    try:
+        async with database.transaction():
+            last_record_id = await database.execute(query)
+            await database.execute(counter_query)
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
+        ) from e
+    await response_cache.invalidate(
+        post_tag(like.post_id), posts_tag(PostSorting.most_likes)
+    )
 
     return {**data, "id": last_record_id}
+
+
+MAX_BULK_ITEMS = 1000
+# keeps a multi-row INSERT under the 999 bound parameters of older sqlite builds
+BULK_INSERT_BATCH_SIZE = 250
+
+
+async def insert_many(table: sqlalchemy.Table, rows: list[dict]) -> list[int]:
+    """Inserts rows with multi-row INSERTs and returns their ids in order.
+
+    Must run inside a transaction: sqlite then hands out consecutive
+    rowids, so the ids of a batch end at the last inserted rowid.
+    """
+    ids: list[int] = []
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        batch = rows[start : start + BULK_INSERT_BATCH_SIZE]
+        query = table.insert().values(batch)
+        logger.debug(query)
+        last_record_id = await database.execute(query)
+        ids.extend(range(last_record_id - len(batch) + 1, last_record_id + 1))
+    return ids
+
+
+async def find_existing_post_ids(post_ids: set[int]) -> set[int]:
+    query = sqlalchemy.select(post_table.c.id).where(post_table.c.id.in_(post_ids))
+    logger.debug(query)
+    return {row.id for row in await database.fetch_all(query)}
+
+
+def post_deleted_during_batch(e: sqlite3.IntegrityError) -> HTTPException:
+    # a post found by find_existing_post_ids was deleted before the INSERT,
+    # the transaction rolled back and nothing of the batch was written
+    logger.warning("Bulk write hit a deleted post: %s", e)
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A post was deleted while the batch was written, retry it.",
+    )
+
+
+def bulk_results(count: int, created: dict[int, int]) -> list[BulkItemResult]:
+    """created maps request indexes to new ids, the other items had an unknown post."""
+    return [
+        (
+            BulkItemResult(
+                index=index, status_code=status.HTTP_201_CREATED, id=created[index]
+            )
+            if index in created
+            else BulkItemResult(
+                index=index,
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found.",
+            )
+        )
+        for index in range(count)
+    ]
+
+
+@router.post(
+    "/post/bulk",
+    response_model=list[BulkItemResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+)
+async def create_posts_bulk(
+    posts: Annotated[list[UserPostIn], Body(min_length=1, max_length=MAX_BULK_ITEMS)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    logger.info("Creating %s posts.", len(posts))
+    rows = [{**post.model_dump(), "user_id": current_user.id} for post in posts]
+
+    async with database.transaction():
+        ids = await insert_many(post_table, rows)
+    await response_cache.invalidate(*(posts_tag(sorting) for sorting in PostSorting))
+
+    return bulk_results(len(posts), dict(enumerate(ids)))
+
+
+@router.post(
+    "/comment/bulk",
+    response_model=list[BulkItemResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+)
+async def create_comments_bulk(
+    comments: Annotated[list[CommentIn], Body(min_length=1, max_length=MAX_BULK_ITEMS)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    logger.info("Creating %s comments.", len(comments))
+    existing = await find_existing_post_ids({comment.post_id for comment in comments})
+    indexes = [i for i, comment in enumerate(comments) if comment.post_id in existing]
+    rows = [{**comments[i].model_dump(), "user_id": current_user.id} for i in indexes]
+
+    try:
+        async with database.transaction():
+            ids = await insert_many(comment_table, rows)
+    except sqlite3.IntegrityError as e:
+        raise post_deleted_during_batch(e) from e
+    post_ids = {row["post_id"] for row in rows}
+    await response_cache.invalidate(
+        *(post_tag(post_id) for post_id in post_ids),
+        *(comments_tag(post_id) for post_id in post_ids),
+    )
+
+    return bulk_results(len(comments), dict(zip(indexes, ids)))
+
+
+@router.post(
+    "/like/bulk",
+    response_model=list[BulkItemResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+)
+async def like_posts_bulk(
+    likes: Annotated[list[PostLikeIn], Body(min_length=1, max_length=MAX_BULK_ITEMS)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    logger.info("Liking %s posts.", len(likes))
+    existing = await find_existing_post_ids({like.post_id for like in likes})
+    indexes = [i for i, like in enumerate(likes) if like.post_id in existing]
+    rows = [{**likes[i].model_dump(), "user_id": current_user.id} for i in indexes]
+
+    new_likes = Counter(row["post_id"] for row in rows)
+    # one UPDATE bumps the counter of every liked post by its number of new likes
+    counter_query = (
+        post_table.update()
+        .where(post_table.c.id.in_(new_likes))
+        .values(
+            like_count=post_table.c.like_count
+            + sqlalchemy.case(new_likes, value=post_table.c.id)
+        )
+    )
+
+    try:
+        async with database.transaction():
+            ids = await insert_many(like_table, rows)
+            if new_likes:
+                logger.debug(counter_query)
+                await database.execute(counter_query)
+    except sqlite3.IntegrityError as e:
+        raise post_deleted_during_batch(e) from e
+    await response_cache.invalidate(
+        *(post_tag(post_id) for post_id in new_likes),
+        posts_tag(PostSorting.most_likes),
+    )
+
+    return bulk_results(len(likes), dict(zip(indexes, ids)))
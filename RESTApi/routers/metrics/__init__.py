@@ -0,0 +1,7 @@
+from fastapi import APIRouter
+
+router: APIRouter = APIRouter(
+    prefix="",
+)
+
+from . import routers
@@ -0,0 +1,87 @@
+from fastapi import Response
+
+from ...config import config
+from ...db import database, read_database
+from ...logging_conf import queue_handlers
+from ...media import media_queue
+from ...metrics import Counter, Gauge, SnapshotFiles, merge, registry, render
+from ...response_cache import response_cache
+from ...security import password_pool, token_cache, user_cache
+from ..upload.routers import blob_metadata_cache, upload_limit
+from . import router
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+pool_usage: Gauge = registry.gauge(
+    "pool_usage", "State of the bounded pools and limits.", ("pool", "state")
+)
+cache_usage: Gauge = registry.gauge(
+    "cache_usage", "Size, hits and misses of the in-process caches.", ("cache", "state")
+)
+log_records_dropped: Gauge = registry.gauge(
+    "log_records_dropped", "Log records dropped by a full logging queue."
+)
+db_connections: Gauge = registry.gauge(
+    "db_connections_in_use",
+    "Connections the databases backend has open, its pool usage.",
+    ("database",),
+)
+db_connections_opened: Counter = registry.counter(
+    "db_connections_opened_total",
+    "Connections handed out by the databases backend.",
+    ("database",),
+)
+
+
+@registry.collector
+def collect_pools() -> None:
+    for name, stats in (
+        ("password_hash", password_pool.stats()),
+        ("upload", upload_limit.stats()),
+        ("media", media_queue.stats()),
+    ):
+        for state, value in stats.items():
+            pool_usage.set(name, state, value=value)
+
+
+@registry.collector
+def collect_caches() -> None:
+    caches = {
+        "user": user_cache,
+        "token": token_cache,
+        "blob_metadata": blob_metadata_cache,
+    }
+    backend = response_cache.backend
+    if hasattr(backend, "stats"):
+        caches["response"] = backend
+    for name, cache in caches.items():
+        for state, value in cache.stats().items():
+            cache_usage.set(name, state, value=value)
+
+
+@registry.collector
+def collect_logging() -> None:
+    log_records_dropped.set(value=sum(h.dropped for h in queue_handlers))
+
+
+@registry.collector
+def collect_connections() -> None:
+    databases = {"primary": database}
+    if read_database is not database:
+        databases["replica"] = read_database
+    for name, db in databases.items():
+        db_connections.set(name, value=db.connections_in_use)
+        db_connections_opened.set(name, value=db.connections_opened)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint, the sum of all workers with METRICS_DIR."""
+    snapshot = registry.snapshot()
+    if config.METRICS_DIR:
+        files = SnapshotFiles(config.METRICS_DIR)
+        files.write(snapshot)
+        snapshots = files.read()
+    else:
+        snapshots = [snapshot]
+    return Response(content=render(merge(snapshots)), media_type=CONTENT_TYPE)
@@ -1,33 +1,88 @@
 import logging
-import tempfile
-from pathlib import Path
+import re
+from contextlib import asynccontextmanager
 
-import aiofiles
-from fastapi import HTTPException, UploadFile, status
+import sqlalchemy
+from fastapi import Header, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import JSONResponse
 
+from ...cache import TTLCache
+from ...config import config
+from ...db import database, media_job_table, media_table, upload_table
+from ...db.routing import reader
+from ...download import (
+    IMMUTABLE,
+    BlobResponse,
+    etag_matches,
+    etag_of,
+    parse_range,
+)
+from ...media import media_queue
+from ...models.upload import MediaStatus, UploadOut, UploadSession, UploadSessionIn
+from ...pool import ConcurrencyLimit, PoolSaturatedError
+from ...resumable import append, create_session, delete_session, get_session
+from ...storage import (
+    StoredBlob,
+    blob_path,
+    blob_relative_path,
+    blob_url,
+    guess_content_type,
+    store_upload,
+)
+from ...upload_stream import check_content_length, stream_upload
 from . import router
 
-chunk_size = 1024 * 1024
-UPLOAD_DIRECTORY = Path(__file__).resolve().parent.parent.parent / "static/uploads"
-
 logger = logging.getLogger(__name__)
 
+# streamed uploads hold a connection and a file open for as long as they run
+upload_limit = ConcurrencyLimit(
+    "upload",
+    limit=config.UPLOAD_MAX_CONCURRENT,
+    queue_timeout=config.UPLOAD_QUEUE_TIMEOUT_SECONDS,
+)
 
-@router.post("/upload", status_code=status.HTTP_201_CREATED)
-async def upload_file(file: UploadFile):
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+# blobs never change, neither does what is served for them
+blob_metadata_cache = TTLCache(maxsize=4096, ttl=60 * 60)
+
+
+@asynccontextmanager
+async def upload_slot():
     try:
-        # Ensure the upload directory exists
-        UPLOAD_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        async with upload_limit.slot():
+            yield
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many uploads in progress, try again later.",
+            headers={"Retry-After": "1"},
+        ) from e
 
-        file_location = UPLOAD_DIRECTORY / file.filename
 
-        logger.info(f"Saving uploaded file to {file_location}")
-        async with aiofiles.open(file_location, "wb") as f:
-            while chunk := await file.read(chunk_size):
-                await f.write(chunk)
+async def record_upload(filename: str, blob: StoredBlob) -> dict:
+    data = {
+        "filename": filename,
+        "digest": blob.digest,
+        "size": blob.size,
+        "content_type": blob.content_type,
+    }
+    upload_id = await database.execute(upload_table.insert().values(data))
+    if blob.created:
+        await media_queue.enqueue(blob.digest, blob.content_type)
 
-        file_url = f"/static/uploads/{file.filename}"
+    return {
+        **data,
+        "id": upload_id,
+        "file_url": blob.url,
+        "created": blob.created,
+        "detail": f"Successfully uploaded {filename}",
+    }
 
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED, response_model=UploadOut)
+async def upload_file(file: UploadFile):
+    try:
+        blob = await store_upload(file)
     except Exception as e:
         logger.error(f"Error while uploading file: {e}", exc_info=True)
         raise HTTPException(
@@ -35,4 +90,210 @@ async def upload_file(file: UploadFile):
             detail="There was an error uploading the file",
         ) from e
 
-    return {"detail": f"Successfully uploaded {file.filename}", "file_url": file_url}
+    return await record_upload(file.filename, blob)
+
+
+@router.post(
+    "/upload/stream",
+    status_code=status.HTTP_201_CREATED,
+    response_model=UploadOut,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    }
+                }
+            },
+        }
+    },
+)
+async def stream_upload_file(request: Request):
+    """Same as /upload, but the body is parsed as it arrives and the file
+    is written once, without being spooled first.
+    """
+    check_content_length(request, config.UPLOAD_MAX_BYTES)
+    async with upload_slot():
+        upload = await stream_upload(request, max_bytes=config.UPLOAD_MAX_BYTES)
+
+    return await record_upload(upload.filename, upload.blob)
+
+
+def offset_headers(session) -> dict[str, str]:
+    return {
+        "Upload-Offset": str(session.upload_offset),
+        "Upload-Length": str(session.size),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post(
+    "/upload/sessions",
+    status_code=status.HTTP_201_CREATED,
+    response_model=UploadSession,
+)
+async def create_upload_session(session_in: UploadSessionIn, response: Response):
+    """Starts a resumable upload of size bytes, sent by PATCH requests
+    to the returned Location.
+    """
+    if session_in.size > config.UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload larger than {config.UPLOAD_MAX_BYTES} bytes.",
+        )
+    session = await create_session(
+        filename=session_in.filename,
+        size=session_in.size,
+        content_type=guess_content_type(session_in.content_type, session_in.filename),
+    )
+    response.headers["Location"] = f"/upload/sessions/{session['id']}"
+    response.headers["Upload-Offset"] = "0"
+    return session
+
+
+@router.head("/upload/sessions/{session_id}")
+async def get_upload_offset(session_id: str):
+    session = await get_session(session_id)
+    return Response(headers=offset_headers(session))
+
+
+@router.patch(
+    "/upload/sessions/{session_id}",
+    responses={
+        status.HTTP_201_CREATED: {"model": UploadOut},
+        status.HTTP_204_NO_CONTENT: {"description": "Chunk stored, more expected"},
+    },
+)
+async def append_upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(alias="Upload-Offset"),
+    content_type: str = Header(alias="Content-Type"),
+):
+    """Appends the body at Upload-Offset, which must be the current offset.
+
+    Answers 204 with the new offset, or 201 with the stored upload once
+    the last byte arrived.
+    """
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream.",
+        )
+    session = await get_session(session_id)
+    async with upload_slot():
+        new_offset, blob = await append(session, upload_offset, request.stream())
+
+    headers = {"Upload-Offset": str(new_offset)}
+    if blob is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+
+    upload = UploadOut(**await record_upload(session.filename, blob))
+    return JSONResponse(
+        upload.model_dump(),
+        status_code=status.HTTP_201_CREATED,
+        headers=headers,
+    )
+
+
+@router.delete("/upload/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload_session(session_id: str):
+    await get_session(session_id)
+    await delete_session(session_id)
+
+
+async def get_rendition_metadata(digest: str):
+    query = (
+        sqlalchemy.select(media_table.c.size, media_table.c.content_type)
+        .where(media_table.c.rendition_digest == digest)
+        .limit(1)
+    )
+    return await reader().fetch_one(query)
+
+
+async def get_blob_metadata(digest: str):
+    """Size and content type of a blob.
+
+    No filename, the same content uploaded by several users is one blob and
+    its URL must not tell one user the filename another one picked.
+    """
+    metadata = blob_metadata_cache.get(digest)
+    if metadata is None:
+        query = (
+            sqlalchemy.select(upload_table.c.size, upload_table.c.content_type)
+            .where(upload_table.c.digest == digest)
+            .order_by(upload_table.c.id)
+            .limit(1)
+        )
+        metadata = await reader().fetch_one(query)
+        if metadata is None:
+            metadata = await get_rendition_metadata(digest)
+        if metadata is not None:
+            blob_metadata_cache.set(digest, metadata)
+    return metadata
+
+
+@router.api_route("/uploads/{digest}", methods=["GET", "HEAD"])
+async def download_upload(digest: str, request: Request):
+    """The uploaded file stored under digest.
+
+    Supports a single byte range, and 304 for a client that already has it.
+    """
+    if not DIGEST_PATTERN.fullmatch(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found.")
+
+    etag = etag_of(digest)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    metadata = await get_blob_metadata(digest)
+    if metadata is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found.")
+
+    if config.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+        return BlobResponse(
+            blob_path(digest),
+            metadata.size,
+            metadata.content_type,
+            headers,
+            accel_redirect=(
+                f"{config.DOWNLOAD_ACCEL_REDIRECT_PREFIX}/{blob_relative_path(digest)}"
+            ),
+        )
+
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(request.headers.get("range"), metadata.size)
+    return BlobResponse(
+        blob_path(digest), metadata.size, metadata.content_type, headers, byte_range
+    )
+
+
+@router.get("/uploads/{digest}/media", response_model=MediaStatus)
+async def get_media_status(digest: str):
+    """Processing state of an uploaded image and the renditions made of it."""
+    job = await reader().fetch_one(
+        media_job_table.select().where(media_job_table.c.digest == digest)
+    )
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found.")
+    renditions = await reader().fetch_all(
+        media_table.select()
+        .where(media_table.c.digest == digest)
+        .order_by(media_table.c.id)
+    )
+    return {
+        "digest": digest,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "renditions": [
+            {**rendition._mapping, "file_url": blob_url(rendition.rendition_digest)}
+            for rendition in renditions
+        ],
+    }
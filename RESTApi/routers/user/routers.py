@@ -15,9 +15,10 @@ from ...security import (
     authenticate_user,
     create_access_token,
     create_confirmation_token,
-    get_password_hash,
+    get_password_hash_async,
     get_subject_for_token_type,
     get_user,
+    user_cache,
 )
 from . import router
 
@@ -32,12 +33,13 @@ async def register(user: UserIn, request: Request):
             detail="A user with that email already exists .",
         )
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     query = user_table.insert().values(email=user.email, password=hashed_password)
 
     logger.debug(query)
 
     await database.execute(query)
+    user_cache.invalidate(user.email)
 
     return {
         "detail": "User created",
@@ -145,4 +147,5 @@ async def confirm_email(token: str):
     logger.debug(query)
 
     await database.execute(query)
+    user_cache.invalidate(email)
     return {"detail": "User confirmed"}
@@ -1,13 +1,17 @@
+import hashlib
 import logging
+import time
 from datetime import UTC, datetime, timedelta
+from functools import cache
 from typing import Annotated, Literal
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import ExpiredSignatureError, JWTError, jwt
-from passlib.context import CryptContext
 
+from .cache import TTLCache
+from .config import config
 from .db import database, user_table
+from .pool import BoundedThreadPool, PoolSaturatedError
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -19,7 +23,46 @@ ALGORITHM = "HS256"
 # or relative URL to your API's token endpoint
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# python-jose and passlib are imported on first use, not at worker start
+@cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# resolved once, an import statement in the token functions would look up
+# the module on every authenticated request
+@cache
+def get_jwt():
+    from jose import jwt
+
+    return jwt
+
+
+@cache
+def get_jwt_errors():
+    from jose import ExpiredSignatureError, JWTError
+
+    return ExpiredSignatureError, JWTError
+
+
+# keeps bcrypt off the event loop
+password_pool = BoundedThreadPool(
+    "password_hash",
+    max_workers=config.PASSWORD_HASH_WORKERS,
+    queue_timeout=config.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
+
+# users keyed by email, writes to a user row must call user_cache.invalidate
+user_cache = TTLCache(
+    maxsize=config.USER_CACHE_MAX_SIZE, ttl=config.USER_CACHE_TTL_SECONDS
+)
+# verified claims keyed by the sha256 digest of the token
+token_cache = TTLCache(
+    maxsize=config.TOKEN_CACHE_MAX_SIZE, ttl=config.TOKEN_CACHE_TTL_SECONDS
+)
 
 
 def create_credentials_exception(detail: str) -> HTTPException:
@@ -35,6 +78,7 @@ def confirm_token_expire_minutes():
 
 
 def create_access_token(email: str):
+    jwt = get_jwt()
     logger.debug("Creating confirmation token", extra={"email": email})
     expire: datetime = datetime.now(UTC) + timedelta(
         minutes=access_token_expire_minutes()
@@ -45,6 +89,7 @@ def create_access_token(email: str):
 
 
 def create_confirmation_token(email: str):
+    jwt = get_jwt()
     logger.debug("Creating confirmation token", extra={"email": email})
     expire = datetime.now(UTC) + timedelta(minutes=confirm_token_expire_minutes())
     jwt_data = {"sub": email, "exp": expire, "type": "confirmation"}
@@ -57,11 +102,30 @@ def access_token_expire_minutes() -> int:
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+async def run_in_password_pool(func, *args):
+    try:
+        return await password_pool.run(func, *args)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later.",
+            headers={"Retry-After": "1"},
+        ) from e
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await run_in_password_pool(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_password_pool(verify_password, plain_password, hashed_password)
 
 
 async def get_user(email: str):
@@ -73,11 +137,11 @@ async def get_user(email: str):
 
 
 async def authenticate_user(email: str, password: str):
-    logger.debug("Authenticating user...", extra={"email", email})
+    logger.debug("Authenticating user...", extra={"email": email})
     user = await get_user(email)
     if not user:
         raise create_credentials_exception("Invalid email or password")
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         raise create_credentials_exception("Invalid email or password")
     if not user.confirmed:
         raise create_credentials_exception("User has not confirmed email")
@@ -86,17 +150,41 @@ async def authenticate_user(email: str, password: str):
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     email: str = get_subject_for_token_type(token, "access")
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
     user = await get_user(email=email)
     if user is None:
         raise create_credentials_exception("Could not find user for this token")
+    user_cache.set(email, user)
     return user
 
 
+def decode_token(token: str) -> dict:
+    """jwt.decode that remembers the claims of tokens it has already verified.
+
+    Entries expire no later than the exp claim, so expired tokens always
+    go through jwt.decode again and raise ExpiredSignatureError.
+    """
+    jwt = get_jwt()
+    key: bytes = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, key=SECRET_KEY, algorithms=ALGORITHM)
+    expire = payload.get("exp")
+    token_cache.set(key, payload, ttl=None if expire is None else expire - time.time())
+    return payload
+
+
 def get_subject_for_token_type(
     token: str, token_type: Literal["access", "confirmation"]
 ) -> str:
+    ExpiredSignatureError, JWTError = get_jwt_errors()
     try:
-        payload = jwt.decode(token, key=SECRET_KEY, algorithms=ALGORITHM)
+        payload = decode_token(token)
     except ExpiredSignatureError as e:
         raise create_credentials_exception("Token has expired.") from e
     except JWTError as e:
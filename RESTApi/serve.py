@@ -0,0 +1,96 @@
+"""Production entry point, python -m RESTApi.
+
+Runs migrations once, then serves the app from SERVER_WORKERS processes.
+On SIGTERM uvicorn stops accepting connections, waits up to
+SERVER_GRACEFUL_TIMEOUT_SECONDS for in-flight requests and runs the
+lifespan shutdown of every worker, which disconnects the database.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+from importlib.util import find_spec
+
+from .config import GlobalConfig, config
+
+
+def worker_count(workers: int | None) -> int:
+    return workers or os.cpu_count() or 1
+
+
+def server_options(config: GlobalConfig, workers: int | None = None) -> dict:
+    """Keyword arguments for uvicorn.run."""
+    return {
+        "host": config.SERVER_HOST,
+        "port": config.SERVER_PORT,
+        "workers": worker_count(workers or config.SERVER_WORKERS),
+        # the "auto" choices, only stated so a missing extra shows up in the logs
+        "loop": "uvloop" if find_spec("uvloop") else "asyncio",
+        "http": "httptools" if find_spec("httptools") else "h11",
+        "backlog": config.SERVER_BACKLOG,
+        "timeout_keep_alive": config.SERVER_KEEPALIVE_SECONDS,
+        "timeout_graceful_shutdown": config.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        "proxy_headers": True,
+        "access_log": config.SERVER_ACCESS_LOG,
+    }
+
+
+def migrate_once() -> None:
+    """Applies the pending migrations before the workers start,
+    so they do not all race to do it from their lifespan.
+    """
+    from .db.migrations import migrate_url
+
+    if config.DATABASE_URL:
+        applied = asyncio.run(migrate_url(config.DATABASE_URL))
+        print(f"Applied migrations: {applied or 'none'}")
+    prefix = config.model_config.get("env_prefix", "")
+    os.environ[f"{prefix}DB_MIGRATE_ON_STARTUP"] = "false"
+
+
+def share_metrics(workers: int) -> str | None:
+    """Gives the workers a temporary METRICS_DIR, so /metrics sums all of them."""
+    if workers > 1 and config.METRICS_ENABLED and not config.METRICS_DIR:
+        prefix = config.model_config.get("env_prefix", "")
+        directory = tempfile.mkdtemp(prefix="restapi-metrics-")
+        os.environ[f"{prefix}METRICS_DIR"] = directory
+        return directory
+    return None
+
+
+def disable_memory_cache(workers: int) -> bool:
+    """Turns the response cache off when it would be one per worker.
+
+    A write only invalidates the memory cache of the worker that handled
+    it, the others would serve stale responses until the ttl. Several
+    workers need RESPONSE_CACHE_BACKEND=redis to share one.
+    """
+    if workers > 1 and config.RESPONSE_CACHE_BACKEND == "memory":
+        prefix = config.model_config.get("env_prefix", "")
+        os.environ[f"{prefix}RESPONSE_CACHE_BACKEND"] = "none"
+        return True
+    return False
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m RESTApi")
+    parser.add_argument(
+        "--workers", type=int, help="defaults to SERVER_WORKERS, else the core count"
+    )
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    migrate_once()
+    options = server_options(config, args.workers)
+    metrics_dir = share_metrics(options["workers"])
+    if disable_memory_cache(options["workers"]):
+        print("Response cache off, the memory backend is per worker, use redis")
+    print(f"Starting {options['workers']} workers on port {options['port']}")
+    try:
+        uvicorn.run("RESTApi:create_app", factory=True, **options)
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,162 @@
+"""Content addressed storage of the uploaded files.
+
+A blob is stored once under the sha256 of its content, sharded by the
+first two bytes of the digest: static/uploads/ab/cd/abcd...
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import UploadFile
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_DIRECTORY = Path(__file__).resolve().parent / "static/uploads"
+# served by the download route, not the static mount
+UPLOAD_URL = "/uploads"
+# not served, on the same filesystem as the blobs so a finished file is renamed
+PARTIAL_DIRECTORY = Path(__file__).resolve().parent / ".partial_uploads"
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    digest: str
+    size: int
+    content_type: str
+    # False when a blob with the same content was already stored
+    created: bool
+
+    @property
+    def url(self) -> str:
+        return blob_url(self.digest)
+
+
+def blob_relative_path(digest: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def blob_path(digest: str) -> Path:
+    return UPLOAD_DIRECTORY / blob_relative_path(digest)
+
+
+def blob_url(digest: str) -> str:
+    return f"{UPLOAD_URL}/{digest}"
+
+
+def guess_content_type(content_type: str | None, filename: str | None) -> str:
+    """The type the client sent, else the one of the file extension."""
+    if content_type and content_type != "application/octet-stream":
+        return content_type
+    guessed, _ = mimetypes.guess_type(filename or "")
+    return guessed or "application/octet-stream"
+
+
+async def hash_upload(file: UploadFile) -> tuple[str, int]:
+    """sha256 and size of the upload, read chunk by chunk."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+async def store_upload(file: UploadFile) -> StoredBlob:
+    """Stores the content of file unless a blob with the same digest exists.
+
+    The upload is already spooled by starlette, so it is hashed first and
+    only written when it is new. Writes go to a temporary file that is
+    renamed into place, a reader never sees a partial blob.
+    """
+    import aiofiles
+
+    digest, size = await hash_upload(file)
+    blob = StoredBlob(
+        digest=digest,
+        size=size,
+        content_type=guess_content_type(file.content_type, file.filename),
+        created=False,
+    )
+    path = blob_path(digest)
+    if path.exists():
+        logger.debug("Blob %s already stored", digest)
+        return blob
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{digest}.{uuid.uuid4().hex}.part")
+    await file.seek(0)
+    try:
+        async with aiofiles.open(partial, "wb") as f:
+            while chunk := await file.read(CHUNK_SIZE):
+                await f.write(chunk)
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    logger.info("Stored blob %s (%s bytes)", digest, size)
+    return StoredBlob(digest, size, blob.content_type, created=True)
+
+
+def move_to_blob(partial: Path, digest: str) -> bool:
+    """Moves the finished partial file to the blob of digest.
+
+    Returns False, and deletes partial, when that blob already exists.
+    """
+    path = blob_path(digest)
+    if path.exists():
+        partial.unlink()
+        logger.debug("Blob %s already stored", digest)
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(partial, path)
+    logger.info("Stored blob %s", digest)
+    return True
+
+
+class BlobWriter:
+    """Writes content of a not yet known digest exactly once.
+
+    Chunks go to a partial file while they are hashed, commit moves it to
+    its content address, or drops it when that blob already exists.
+    """
+
+    def __init__(self, content_type: str = "application/octet-stream") -> None:
+        self.content_type: str = content_type
+        self.size: int = 0
+        self._digest = hashlib.sha256()
+        self._partial: Path = PARTIAL_DIRECTORY / uuid.uuid4().hex
+        self._file = None
+
+    async def write(self, chunk: bytes) -> None:
+        import aiofiles
+
+        if self._file is None:
+            PARTIAL_DIRECTORY.mkdir(parents=True, exist_ok=True)
+            self._file = await aiofiles.open(self._partial, "wb")
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        await self._file.write(chunk)
+
+    async def _close(self) -> None:
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+    async def commit(self) -> StoredBlob:
+        if self._file is None:
+            await self.write(b"")
+        await self._close()
+        digest = self._digest.hexdigest()
+        created = move_to_blob(self._partial, digest)
+        return StoredBlob(digest, self.size, self.content_type, created=created)
+
+    async def abort(self) -> None:
+        await self._close()
+        self._partial.unlink(missing_ok=True)
@@ -0,0 +1,171 @@
+"""Incremental multipart parsing of an upload request.
+
+The file part is written to its final location as the body arrives,
+instead of starlette spooling the whole body before the handler runs.
+"""
+
+import logging
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, Request, status
+
+from .storage import BlobWriter, StoredBlob, guess_content_type
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# room for the boundaries and part headers around the file in Content-Length
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload larger than {max_bytes} bytes.",
+    )
+
+
+def malformed(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def check_content_length(request: Request, max_bytes: int) -> None:
+    """Rejects a body that announces more than max_bytes of file."""
+    content_length = request.headers.get("content-length")
+    if not content_length:
+        return
+    try:
+        length = int(content_length)
+    except ValueError as e:
+        raise malformed("Invalid Content-Length header.") from e
+    if length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise too_large(max_bytes)
+
+
+@dataclass
+class _Part:
+    headers: dict[bytes, bytes] = field(default_factory=dict)
+    header_name: bytes = b""
+    header_value: bytes = b""
+    is_file: bool = False
+
+
+class _FileCollector:
+    """Multipart callbacks that keep the data of the first file part.
+
+    The callbacks are synchronous, the data is queued in pending and
+    written by the caller after every chunk it feeds to the parser.
+    """
+
+    def __init__(self, field_name: str) -> None:
+        self.field_name: str = field_name
+        self.filename: str | None = None
+        self.content_type: str | None = None
+        self.pending: list[bytes] = []
+        self.done: bool = False
+        self._part = _Part()
+
+    def on_part_begin(self) -> None:
+        self._part = _Part()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._part.header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._part.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._part.headers[self._part.header_name.lower()] = self._part.header_value
+        self._part.header_name = self._part.header_value = b""
+
+    def on_headers_finished(self) -> None:
+        from python_multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(
+            self._part.headers.get(b"content-disposition", b"")
+        )
+        name = options.get(b"name", b"").decode("latin-1")
+        if name != self.field_name or b"filename" not in options or self.done:
+            return
+        self._part.is_file = True
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        content_type = self._part.headers.get(b"content-type")
+        self.content_type = content_type.decode("latin-1") if content_type else None
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._part.is_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self._part.is_file:
+            self.done = True
+            self._part.is_file = False
+
+
+@dataclass(frozen=True)
+class StreamedUpload:
+    filename: str
+    blob: StoredBlob
+
+
+async def stream_upload(
+    request: Request, max_bytes: int, field_name: str = "file"
+) -> StreamedUpload:
+    """Stores the file part field_name of a multipart/form-data request.
+
+    Raises 413 as soon as the file grows past max_bytes, and 400 for a
+    body without the file. Callers check Content-Length with
+    check_content_length first, before waiting for an upload slot.
+    """
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    content_type, options = parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise malformed("Expected a multipart/form-data body.")
+
+    collector = _FileCollector(field_name)
+    parser = MultipartParser(
+        options[b"boundary"],
+        {
+            name: getattr(collector, name)
+            for name in (
+                "on_part_begin",
+                "on_header_field",
+                "on_header_value",
+                "on_header_end",
+                "on_headers_finished",
+                "on_part_data",
+                "on_part_end",
+            )
+        },
+    )
+    writer: BlobWriter | None = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if collector.filename is not None and writer is None:
+                writer = BlobWriter(
+                    guess_content_type(collector.content_type, collector.filename)
+                )
+            for data in collector.pending:
+                if writer.size + len(data) > max_bytes:
+                    raise too_large(max_bytes)
+                await writer.write(data)
+            collector.pending.clear()
+        parser.finalize()
+
+        if writer is None or not collector.done:
+            raise malformed(f"No complete {field_name!r} file part in the body.")
+        blob = await writer.commit()
+    except MultipartParseError as e:
+        if writer is not None:
+            await writer.abort()
+        raise malformed("Malformed multipart body.") from e
+    except BaseException:
+        if writer is not None:
+            await writer.abort()
+        raise
+
+    return StreamedUpload(filename=collector.filename, blob=blob)
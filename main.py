@@ -1,6 +1,5 @@
 import os
-import re
-import subprocess
+import socket
 
 from fastapi import FastAPI
 
@@ -22,22 +21,15 @@ def get_os():
 
 def get_wsl_ip() -> str:
     """
-    Fetch the current external IP address of the WSL2 instance using the same approach as the bash shell.
+    Fetch the address of the interface the WSL2 instance uses for outbound traffic.
+    Connecting a UDP socket sends nothing, it only picks the route.
     """
-    # Run the 'ip addr show' command and get the output
-    result = subprocess.run(
-        ["ip", "addr", "show", "eth0"],
-        stdout=subprocess.PIPE,
-        text=True,
-    )
-
-    # Extract the IP address from the command's output
-    ip_output = result.stdout
-    ip_regex = r"(?<=inet\s)\d+(\.\d+){3}"  # The regex to extract the IP address
-    if match := re.search(ip_regex, ip_output):
-        return match.group()
-    else:
-        raise Exception("Could not determine the WSL2 IP address")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect(("10.255.255.255", 1))
+            return sock.getsockname()[0]
+        except OSError:
+            raise Exception("Could not determine the WSL2 IP address")
 
 
 app: FastAPI = create_app()
@@ -57,6 +49,7 @@ if __name__ == "__main__":
 
         print(f"\n\n*-*-* Access the application at: {access_url} *-*-*\n\n")
 
+    # dev server with the reloader, production runs python -m RESTApi
     # app must have type FastAPI declated otherwise
     # run does not recognise it
     # also need to run sudo service nginx start
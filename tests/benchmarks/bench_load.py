@@ -0,0 +1,396 @@
+"""Throughput and latency of every route under a mixed workload.
+
+Seeds BENCH_USERS users, BENCH_POSTS posts, BENCH_COMMENTS comments and
+BENCH_LIKES likes with INSERT ... SELECT statements, then BENCH_CONCURRENCY
+clients, one in process, send BENCH_REQUESTS requests picked by the weights
+of OPERATIONS. The p50/p95/p99 latency and requests per second of each
+route are printed as JSON, and written to BENCH_OUTPUT when set, to compare
+commits.
+
+In process, over ASGI, the seeded rows are rolled back with the test:
+
+    BENCH_USERS=10000 BENCH_POSTS=1000000 BENCH_LIKES=5000000 \\
+        python -m pytest tests/benchmarks/bench_load.py -q -s
+
+Over real HTTP against python -m RESTApi, seeding the database it serves
+when BENCH_DATABASE_URL is set, those rows stay:
+
+    BENCH_URL=http://localhost:3000 BENCH_DATABASE_URL=sqlite:///data.db \\
+        python -m pytest tests/benchmarks/bench_load.py -q -s
+"""
+
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from RESTApi import storage
+from RESTApi.db import database
+from RESTApi.db.instrumented import InstrumentedDatabase
+
+from .common import Seeded, seed
+
+ROOT = Path(__file__).parent.parent.parent
+
+USERS = int(os.environ.get("BENCH_USERS", "100"))
+POSTS = int(os.environ.get("BENCH_POSTS", "10000"))
+COMMENTS = int(os.environ.get("BENCH_COMMENTS", "20000"))
+LIKES = int(os.environ.get("BENCH_LIKES", "50000"))
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "2000"))
+URL = os.environ.get("BENCH_URL")
+# in process every request shares the one force_rollback connection of the
+# test database, transactions of concurrent requests would interleave on it
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", "16")) if URL else 1
+DATABASE_URL = os.environ.get("BENCH_DATABASE_URL")
+OUTPUT = os.environ.get("BENCH_OUTPUT")
+
+OK_STATUSES = {200, 201, 204, 206, 207}
+
+
+def png(rng: random.Random) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    Image.new("RGB", (640, 480), colour).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest rank percentile of sorted values."""
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class Load:
+    client: AsyncClient
+    token: str
+    seeded: Seeded
+    rng: random.Random = field(default_factory=lambda: random.Random(42))
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+    # digest of every upload, and whether it is an image
+    digests: list[tuple[str, bool]] = field(default_factory=list)
+    contents: list[tuple[str, bytes]] = field(default_factory=list)
+
+    @property
+    def auth(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def request(
+        self, method: str, route: str, url: str, **kwargs
+    ) -> httpx.Response:
+        """Sends one request, timed under the route template."""
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies[f"{method} {route}"].append(time.perf_counter() - start)
+        if response.status_code not in OK_STATUSES:
+            self.errors[f"{method} {route}"] += 1
+        return response
+
+    def post_id(self) -> int:
+        """An existing post, popular ones more often."""
+        size = max(self.seeded.posts, 1)
+        return self.seeded.first_post + int(self.rng.random() ** 2 * size)
+
+    def content(self) -> tuple[str, bytes]:
+        """A file name and content, from a small pool, so some uploads are
+        duplicates as in real traffic, a quarter of them images.
+        """
+        if len(self.contents) < 20:
+            if len(self.contents) % 4:
+                size = self.rng.randint(1024, 64 * 1024)
+                self.contents.append(("load.bin", os.urandom(size)))
+            else:
+                self.contents.append(("load.png", png(self.rng)))
+        return self.rng.choice(self.contents)
+
+
+async def read_feed(load: Load) -> None:
+    sorting = load.rng.choice(["new", "old", "most_likes"])
+    response = await load.request("GET", "/post", "/post", params={"sorting": sorting})
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor and load.rng.random() < 0.3:
+        await load.request(
+            "GET", "/post", "/post", params={"sorting": sorting, "cursor": cursor}
+        )
+
+
+async def read_post(load: Load) -> None:
+    await load.request("GET", "/post/{post_id}", f"/post/{load.post_id()}")
+
+
+async def read_comments(load: Load) -> None:
+    await load.request(
+        "GET", "/post/{post_id}/comment", f"/post/{load.post_id()}/comment"
+    )
+
+
+async def create_post(load: Load) -> None:
+    await load.request(
+        "POST", "/post", "/post", json={"body": "Load test"}, headers=load.auth
+    )
+
+
+async def create_comment(load: Load) -> None:
+    await load.request(
+        "POST",
+        "/comment",
+        "/comment",
+        json={"body": "Load test", "post_id": load.post_id()},
+        headers=load.auth,
+    )
+
+
+async def like(load: Load) -> None:
+    await load.request(
+        "POST", "/like", "/like", json={"post_id": load.post_id()}, headers=load.auth
+    )
+
+
+async def bulk(load: Load) -> None:
+    kind = load.rng.choice(["post", "comment", "like"])
+    if kind == "post":
+        items = [{"body": "Load test"}] * 50
+    elif kind == "comment":
+        items = [{"body": "Load test", "post_id": load.post_id()} for _ in range(50)]
+    else:
+        items = [{"post_id": load.post_id()} for _ in range(50)]
+    await load.request(
+        "POST", f"/{kind}/bulk", f"/{kind}/bulk", json=items, headers=load.auth
+    )
+
+
+async def root(load: Load) -> None:
+    await load.request("GET", "/", "/")
+
+
+async def metrics(load: Load) -> None:
+    await load.request("GET", "/metrics", "/metrics")
+
+
+def confirmation_path(registered: dict) -> str:
+    url = registered["confirmation_url"]
+    # /register returns the starlette URL object, serialized as a dict
+    return httpx.URL(url["_url"] if isinstance(url, dict) else url).path
+
+
+async def sign_up(load: Load) -> None:
+    user = {"email": f"load-{uuid.uuid4().hex}@example.net", "password": "1234"}
+    response = await load.request("POST", "/register", "/register", json=user)
+    await load.request("GET", "/confirm/{token}", confirmation_path(response.json()))
+    await load.request("POST", "/token", "/token", json=user)
+
+
+def upload_file(filename: str, content: bytes) -> dict:
+    return {"file": (filename, content, "application/octet-stream")}
+
+
+async def upload(load: Load) -> None:
+    if load.rng.random() < 0.5:
+        route = "/upload"
+    else:
+        route = "/upload/stream"
+    response = await load.request(
+        "POST", route, route, files=upload_file(*load.content())
+    )
+    if response.status_code == 201:
+        upload = response.json()
+        digest = upload["file_url"].rsplit("/", 1)[-1]
+        load.digests.append((digest, upload["content_type"].startswith("image/")))
+
+
+async def resumable_upload(load: Load) -> None:
+    filename, content = load.content()
+    response = await load.request(
+        "POST",
+        "/upload/sessions",
+        "/upload/sessions",
+        json={"filename": filename, "size": len(content)},
+    )
+    location = response.headers["Location"]
+    route = "/upload/sessions/{session_id}"
+    half = len(content) // 2
+    for offset, chunk in ((0, content[:half]), (half, content[half:])):
+        await load.request(
+            "PATCH",
+            route,
+            location,
+            content=chunk,
+            headers={
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+        )
+    abandoned = await load.request(
+        "POST",
+        "/upload/sessions",
+        "/upload/sessions",
+        json={"filename": filename, "size": len(content)},
+    )
+    await load.request("HEAD", route, abandoned.headers["Location"])
+    await load.request("DELETE", route, abandoned.headers["Location"])
+
+
+async def download(load: Load) -> None:
+    if not load.digests:
+        await upload(load)
+        return
+    digest, image = load.rng.choice(load.digests)
+    route = "/uploads/{digest}"
+    choice = load.rng.random()
+    if choice < 0.6:
+        await load.request("GET", route, f"/uploads/{digest}")
+    elif choice < 0.8:
+        await load.request(
+            "GET", route, f"/uploads/{digest}", headers={"Range": "bytes=0-1023"}
+        )
+    elif choice < 0.9 or not image:
+        await load.request("HEAD", route, f"/uploads/{digest}")
+    else:
+        await load.request("GET", "/uploads/{digest}/media", f"/uploads/{digest}/media")
+
+
+# a read heavy social feed, writes a few percent, bcrypt routes rare
+OPERATIONS: dict[Callable[[Load], Awaitable[None]], float] = {
+    read_feed: 30,
+    read_post: 20,
+    read_comments: 15,
+    like: 8,
+    create_comment: 5,
+    create_post: 4,
+    download: 6,
+    upload: 2,
+    resumable_upload: 1,
+    bulk: 1,
+    root: 2,
+    metrics: 1,
+    sign_up: 0.5,
+}
+
+
+async def drive(load: Load, requests: int, concurrency: int) -> float:
+    """Runs operations until requests were sent, returns the seconds taken."""
+    operations, weights = list(OPERATIONS), list(OPERATIONS.values())
+
+    def sent() -> int:
+        return sum(len(latencies) for latencies in load.latencies.values())
+
+    async def client() -> None:
+        while sent() < requests:
+            operation = load.rng.choices(operations, weights)[0]
+            await operation(load)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def report(load: Load, seconds: float) -> dict:
+    routes = {}
+    for route, latencies in sorted(load.latencies.items()):
+        ordered = sorted(latencies)
+        routes[route] = {
+            "requests": len(ordered),
+            "errors": load.errors[route],
+            "rps": round(len(ordered) / seconds, 1),
+            **{
+                f"p{q}_ms": round(percentile(ordered, q) * 1000, 2)
+                for q in (50, 95, 99)
+            },
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "commit": git_commit(),
+        "transport": "http" if URL else "asgi",
+        "concurrency": CONCURRENCY,
+        "seed": {
+            "users": USERS,
+            "posts": POSTS,
+            "comments": COMMENTS,
+            "likes": LIKES,
+            "seconds": round(load.seeded.seconds, 2),
+        },
+        "requests": total,
+        "errors": sum(load.errors.values()),
+        "seconds": round(seconds, 3),
+        "rps": round(total / seconds, 1),
+        "routes": routes,
+    }
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        check=False,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() or None
+
+
+async def login_over_http(client: AsyncClient) -> str:
+    user = {"email": f"load-{uuid.uuid4().hex}@example.net", "password": "1234"}
+    response = await client.post("/register", json=user)
+    response.raise_for_status()
+    (await client.get(confirmation_path(response.json()))).raise_for_status()
+    return (await client.post("/token", json=user)).json()["access_token"]
+
+
+async def existing_posts(client: AsyncClient, token: str) -> Seeded:
+    """The post ids a server already has, 100 new ones when it has none."""
+    oldest = (await client.get("/post", params={"sorting": "old", "limit": 1})).json()
+    if not oldest:
+        posts = [{"body": "Load test"}] * 100
+        headers = {"Authorization": f"Bearer {token}"}
+        await client.post("/post/bulk", json=posts, headers=headers)
+        oldest = (
+            await client.get("/post", params={"sorting": "old", "limit": 1})
+        ).json()
+    newest = (await client.get("/post", params={"sorting": "new", "limit": 1})).json()
+    first, last = oldest[0]["id"], newest[0]["id"]
+    return Seeded(first_post=first, posts=last - first + 1)
+
+
+@pytest.fixture()
+async def load(
+    async_client: AsyncClient, logged_in_token: str, tmp_path: Path, monkeypatch
+) -> AsyncGenerator[Load, None]:
+    if not URL:
+        monkeypatch.setattr(storage, "UPLOAD_DIRECTORY", tmp_path / "uploads")
+        monkeypatch.setattr(storage, "PARTIAL_DIRECTORY", tmp_path / "partial")
+        seeded = await seed(database, USERS, POSTS, COMMENTS, LIKES)
+        yield Load(async_client, logged_in_token, seeded)
+        return
+
+    seeded = None
+    if DATABASE_URL:
+        async with InstrumentedDatabase(DATABASE_URL) as db:
+            seeded = await seed(db, USERS, POSTS, COMMENTS, LIKES)
+    async with AsyncClient(base_url=URL, timeout=60) as client:
+        token = await login_over_http(client)
+        yield Load(client, token, seeded or await existing_posts(client, token))
+
+
+@pytest.mark.anyio
+async def test_load(load: Load):
+    seconds = await drive(load, REQUESTS, CONCURRENCY)
+    result = json.dumps(report(load, seconds), indent=2)
+    print(result)
+    if OUTPUT:
+        Path(OUTPUT).write_text(result)
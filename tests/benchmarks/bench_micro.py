@@ -0,0 +1,175 @@
+"""Time per call of the functions every request goes through.
+
+Each function is timed with timeit, the median of --repeat runs is kept,
+and compared with the committed baseline. The run fails when a function got
+slower than its baseline by more than --tolerance (BENCH_TOLERANCE, 50% by
+default, above the spread of back to back runs) and by more than
+--noise-floor microseconds (BENCH_NOISE_FLOOR_US, 0.5), which keeps the
+sub-microsecond functions from failing on timer noise. The baseline only
+holds for the machine that recorded it, after changing machines or a
+benchmarked function on purpose record a new one with --update:
+
+    python -m tests.benchmarks.bench_micro
+    python -m tests.benchmarks.bench_micro --tolerance 0.1 create_access_token
+    python -m tests.benchmarks.bench_micro --update
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+# the app modules read their config when imported
+os.environ.setdefault("ENV_STATE", "test")
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy.dialects import sqlite  # noqa: E402
+
+from RESTApi.logging_conf import EmailObfuscationFilter, obfuscated  # noqa: E402
+from RESTApi.models import UserPost  # noqa: E402
+from RESTApi.models.post import UserPostWithComments  # noqa: E402
+from RESTApi.routers.main.routers import (  # noqa: E402
+    POST_FIELDS,
+    PostSorting,
+    select_post_and_likes,
+    select_posts_page,
+)
+from RESTApi.security import (  # noqa: E402
+    create_access_token,
+    get_subject_for_token_type,
+    token_cache,
+)
+from RESTApi.serialization import dump_rows  # noqa: E402
+
+from .common import measure  # noqa: E402
+
+BASELINE = Path(__file__).with_name("micro_baseline.json")
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.5"))
+NOISE_FLOOR_US = float(os.environ.get("BENCH_NOISE_FLOOR_US", "0.5"))
+
+EMAIL = "bench.user@example.net"
+TOKEN = create_access_token(EMAIL)
+DIALECT = sqlite.dialect()
+
+posts_adapter = TypeAdapter(list[UserPost])
+post_with_comments_adapter = TypeAdapter(UserPostWithComments)
+
+# one page of the feed, as the records of fetch_all
+POSTS = [
+    SimpleNamespace(id=i, body=f"Post {i}", user_id=i % 7, likes=i % 13)
+    for i in range(50)
+]
+POST_ROWS = [vars(post) for post in POSTS]
+POST_WITH_COMMENTS = {
+    "post": {"id": 1, "body": "Post 1", "user_id": 1, "likes": 3},
+    "comments": [
+        {"id": i, "body": f"Comment {i}", "post_id": 1, "user_id": i % 7}
+        for i in range(20)
+    ],
+}
+
+email_filter = EmailObfuscationFilter()
+record = logging.makeLogRecord({"msg": "Fetching user from the db", "email": EMAIL})
+
+
+def filter_record() -> None:
+    # the filter replaces the email, put it back so every call obfuscates
+    record.email = EMAIL
+    email_filter.filter(record)
+
+
+def get_subject_uncached() -> None:
+    token_cache.clear()
+    get_subject_for_token_type(TOKEN, "access")
+
+
+BENCHMARKS: dict[str, Callable[[], object]] = {
+    "create_access_token": lambda: create_access_token(EMAIL),
+    "get_subject_for_token_type": lambda: get_subject_for_token_type(TOKEN, "access"),
+    "get_subject_for_token_type_uncached": get_subject_uncached,
+    "obfuscated": lambda: obfuscated(EMAIL, 2),
+    "EmailObfuscationFilter.filter": filter_record,
+    "validate_UserPostWithComments": lambda: post_with_comments_adapter.validate_python(
+        POST_WITH_COMMENTS
+    ),
+    "validate_list_UserPost": lambda: posts_adapter.validate_python(
+        POSTS, from_attributes=True
+    ),
+    "dump_rows_UserPost": lambda: dump_rows(POST_ROWS, POST_FIELDS),
+    "compile_select_post_and_likes": lambda: select_post_and_likes.compile(
+        dialect=DIALECT
+    ),
+    "compile_select_posts_page": lambda: select_posts_page(
+        PostSorting.most_likes, 51, [3, 100]
+    ).compile(dialect=DIALECT),
+}
+
+
+def compare(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    tolerance: float,
+    noise_floor_us: float = NOISE_FLOOR_US,
+) -> dict[str, dict]:
+    report = {}
+    for name, seconds in results.items():
+        entry = {"us": round(seconds * 1e6, 3)}
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            slower_us = (seconds - baseline[name]) * 1e6
+            entry["baseline_us"] = round(baseline[name] * 1e6, 3)
+            entry["ratio"] = round(ratio, 3)
+            entry["regressed"] = ratio > 1 + tolerance and slower_us > noise_floor_us
+        report[name] = entry
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks.bench_micro")
+    parser.add_argument("names", nargs="*", help="all of BENCHMARKS by default")
+    parser.add_argument("--repeat", type=int, default=11)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR_US)
+    parser.add_argument(
+        "--update", action="store_true", help="record the results as the baseline"
+    )
+    args = parser.parse_args(argv)
+
+    names = args.names or list(BENCHMARKS)
+    if unknown := set(names) - set(BENCHMARKS):
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    results = {
+        name: measure(BENCHMARKS[name], args.repeat, statistics.median)
+        for name in names
+    }
+
+    stored = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    if args.update:
+        stored = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seconds": {**stored.get("seconds", {}), **results},
+        }
+        BASELINE.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+
+    report = compare(
+        results, stored.get("seconds", {}), args.tolerance, args.noise_floor
+    )
+    print(json.dumps(report, indent=2))
+
+    regressed = [name for name, entry in report.items() if entry.get("regressed")]
+    if regressed:
+        sys.exit(
+            f"Slower than the baseline by more than {args.tolerance:.0%}: "
+            + ", ".join(regressed)
+        )
+
+
+if __name__ == "__main__":
+    main()
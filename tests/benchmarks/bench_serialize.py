@@ -0,0 +1,111 @@
+"""Serializing the rows of the read routes, by FastAPI, Pydantic and orjson.
+
+Seeds a scratch database with --rows posts, all comments of one post, then
+times turning the fetched rows of each read route into its JSON body:
+
+- fastapi: response_model validation, jsonable_encoder and json.dumps,
+  what returning the rows from the route costs
+- pydantic: TypeAdapter.validate_python and dump_json, the previous path
+- rows: RESTApi.serialization, what the routes do now
+
+    python -m tests.benchmarks.bench_serialize --rows 10000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+# the app modules read their config when imported
+os.environ.setdefault("ENV_STATE", "test")
+
+import databases  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from RESTApi.db import comment_table  # noqa: E402
+from RESTApi.db.migrations import migrate_url  # noqa: E402
+from RESTApi.models import UserPost  # noqa: E402
+from RESTApi.models.post import Comment  # noqa: E402
+from RESTApi.routers.main.routers import (  # noqa: E402
+    COMMENT_FIELDS,
+    POST_FIELDS,
+    select_post_and_likes,
+)
+from RESTApi.serialization import dump_rows  # noqa: E402
+
+from .common import measure, seed  # noqa: E402
+
+
+async def fetch(rows: int) -> dict[str, list]:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        await migrate_url(url)
+        async with databases.Database(url) as db:
+            await seed(db, users=0, posts=rows, comments=0, likes=rows)
+            # every comment on the first post, as one large comment page
+            await db.execute(
+                "INSERT INTO comments (body, post_id, user_id) "
+                "SELECT 'Bench comment ' || id, 1, user_id FROM posts"
+            )
+            return {
+                "/post": await db.fetch_all(select_post_and_likes),
+                "/post/{post_id}/comment": await db.fetch_all(
+                    comment_table.select().where(comment_table.c.post_id == 1)
+                ),
+            }
+
+
+def paths(model, names: tuple[str, ...]) -> dict[str, Callable[[list], bytes]]:
+    adapter = TypeAdapter(list[model])
+
+    def fastapi(rows: list) -> bytes:
+        validated = adapter.validate_python(rows, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated)).encode()
+
+    def pydantic(rows: list) -> bytes:
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    def from_rows(rows: list) -> bytes:
+        return dump_rows(rows, names)
+
+    return {"fastapi": fastapi, "pydantic": pydantic, "rows": from_rows}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks.bench_serialize")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    fetched = asyncio.run(fetch(args.rows))
+    models = {
+        "/post": paths(UserPost, POST_FIELDS),
+        "/post/{post_id}/comment": paths(Comment, COMMENT_FIELDS),
+    }
+
+    report = {}
+    for route, serializers in models.items():
+        rows = fetched[route]
+        bodies = {name: func(rows) for name, func in serializers.items()}
+        assert json.loads(bodies["rows"]) == json.loads(bodies["fastapi"])
+        assert bodies["rows"] == bodies["pydantic"]
+
+        ms = {
+            name: measure(lambda: func(rows), args.repeat) * 1000
+            for name, func in serializers.items()
+        }
+        report[route] = {
+            "rows": len(rows),
+            **{f"{name}_ms": round(value, 2) for name, value in ms.items()},
+            "speedup_vs_fastapi": round(ms["fastapi"] / ms["rows"], 1),
+            "speedup_vs_pydantic": round(ms["pydantic"] / ms["rows"], 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Cold start time of a worker: importing the app and building it.
+
+Every run is a fresh interpreter, so nothing is cached between them.
+
+    ENV_STATE=prod python -m tests.benchmarks.bench_startup --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.parent
+
+# imported lazily, a cold start should not pay for them
+DEFERRED_MODULES = ("jose", "passlib", "rich", "aiofiles", "pythonjsonlogger", "PIL")
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import RESTApi
+imported = time.perf_counter()
+RESTApi.create_app()
+created = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "create_app_seconds": created - imported,
+    "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        env={**os.environ, "ENV_STATE": os.environ.get("ENV_STATE", "prod")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def summary(values: list[float]) -> dict[str, float]:
+    return {"min": min(values), "median": statistics.median(values)}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks.bench_startup")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.runs)]
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "import_seconds": summary([r["import_seconds"] for r in runs]),
+                "create_app_seconds": summary([r["create_app_seconds"] for r in runs]),
+                "deferred_modules_loaded": runs[-1]["loaded"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Helpers shared by the benchmarks: bulk seeding and timing."""
+
+import time
+import timeit
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import databases
+
+from RESTApi.security import get_password_hash
+
+# 1..count, sqlite has no generate_series without the extension
+SEQUENCE = (
+    "WITH RECURSIVE seq(n) AS "
+    "(SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :count) "
+)
+
+
+def mod(a: str, b: str) -> str:
+    # the sqlite backend of databases %-formats the compiled sql, so no %
+    return f"({a} - ({a}) / {b} * {b})"
+
+
+# reproducible, skewed towards the first rows as popularity is:
+# the product of two roughly uniform values in [0, size)
+SKEWED = f"{mod('n * 2654435761', ':posts')} * {mod('n * 40503', ':posts')} / :posts"
+
+
+@dataclass
+class Seeded:
+    first_user: int = 0
+    users: int = 0
+    first_post: int = 0
+    posts: int = 0
+    seconds: float = 0
+
+
+async def next_id(db: databases.Database, table: str) -> int:
+    return await db.fetch_val(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+
+
+async def seed(
+    db: databases.Database, users: int, posts: int, comments: int, likes: int
+) -> Seeded:
+    """Inserts the rows in bulk, like_count matching the likes."""
+    start = time.perf_counter()
+    run = uuid.uuid4().hex[:8]
+    seeded = Seeded(users=users, posts=posts)
+    async with db.transaction():
+        seeded.first_user = await next_id(db, "users")
+        if users:
+            await db.execute(
+                "INSERT INTO users (email, password, confirmed) "
+                + SEQUENCE
+                + "SELECT 'bench-' || :run || '-' || n || '@example.net', :password, 1 "
+                "FROM seq",
+                {"count": users, "run": run, "password": get_password_hash("bench")},
+            )
+        else:
+            # the posts of the benchmark user, the only one
+            seeded.first_user -= 1
+            seeded.users = 1
+
+        seeded.first_post = await next_id(db, "posts")
+        if posts:
+            await db.execute(
+                "INSERT INTO posts (body, user_id) "
+                + SEQUENCE
+                + f"SELECT 'Bench post ' || n, :first_user + {mod('n', ':users')} FROM seq",
+                {
+                    "count": posts,
+                    "first_user": seeded.first_user,
+                    "users": seeded.users,
+                },
+            )
+        if posts and comments:
+            await db.execute(
+                "INSERT INTO comments (body, post_id, user_id) "
+                + SEQUENCE
+                + "SELECT 'Bench comment ' || n, "
+                f":first_post + {SKEWED}, "
+                f":first_user + {mod('n', ':users')} FROM seq",
+                {
+                    "count": comments,
+                    "first_post": seeded.first_post,
+                    "posts": posts,
+                    "first_user": seeded.first_user,
+                    "users": seeded.users,
+                },
+            )
+        if posts and likes:
+            first_like = await next_id(db, "likes")
+            await db.execute(
+                "INSERT INTO likes (post_id, user_id) "
+                + SEQUENCE
+                + f"SELECT :first_post + {SKEWED}, "
+                f":first_user + {mod('n * 7', ':users')} FROM seq",
+                {
+                    "count": likes,
+                    "first_post": seeded.first_post,
+                    "posts": posts,
+                    "first_user": seeded.first_user,
+                    "users": seeded.users,
+                },
+            )
+            await db.execute(
+                "UPDATE posts SET like_count = like_count + added.likes FROM "
+                "(SELECT post_id, count(*) AS likes FROM likes "
+                "WHERE id >= :first_like GROUP BY post_id) AS added "
+                "WHERE posts.id = added.post_id",
+                {"first_like": first_like},
+            )
+    seeded.seconds = time.perf_counter() - start
+    return seeded
+
+
+def measure(
+    func: Callable[[], object],
+    repeat: int,
+    summary: Callable[[list[float]], float] = min,
+) -> float:
+    """Seconds per call, summary of repeat runs of about 0.2 s each,
+    the best one by default.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return summary(timer.repeat(repeat=repeat, number=number)) / number
@@ -1,3 +1,4 @@
+import asyncio
 from os import environ
 from pathlib import Path
 from typing import AsyncGenerator, Generator
@@ -22,9 +23,15 @@ from httpx import AsyncClient
 environ["ENV_STATE"] = "test"
 # then the app is initiallized
 from main import app
+from RESTApi import storage
+from RESTApi.config import config
 
 # db should be called first
 from RESTApi.db import database, user_table
+from RESTApi.db.migrations import migrate_url
+from RESTApi.response_cache import response_cache
+from RESTApi.routers.upload.routers import blob_metadata_cache
+from RESTApi.security import token_cache, user_cache
 
 
 # async platform needed for pytest
@@ -34,14 +41,25 @@ def anyio_backend():
     return "asyncio"
 
 
+@pytest.fixture(scope="session", autouse=True)
+def migrated_db() -> None:
+    # committed once, the db fixture only rolls back what the tests write
+    asyncio.run(migrate_url(config.DATABASE_URL))
+
+
 @pytest.fixture(autouse=True)
-async def db() -> AsyncGenerator:
+async def db(migrated_db) -> AsyncGenerator:
     db_file_path = Path(environ["DEV_DATABASE_URL"].split("///")[-1])
 
     if db_file_path.exists():
         db_file_path.unlink()
         print("TEST DB DELETED")
 
+    # the db is rolled back after every test so cached rows would be stale
+    user_cache.clear()
+    token_cache.clear()
+    blob_metadata_cache.clear()
+    await response_cache.clear()
     await database.connect()
     # post_table.clear()
     # comment_table.clear()
@@ -49,6 +67,13 @@ async def db() -> AsyncGenerator:
     await database.disconnect()
 
 
+@pytest.fixture()
+def upload_directories(tmp_path: Path, monkeypatch) -> None:
+    """Stores the blobs and partial uploads of a test under its tmp_path."""
+    monkeypatch.setattr(storage, "UPLOAD_DIRECTORY", tmp_path / "uploads")
+    monkeypatch.setattr(storage, "PARTIAL_DIRECTORY", tmp_path / "partial")
+
+
 @pytest.fixture()
 def client() -> Generator:
     yield TestClient(app)
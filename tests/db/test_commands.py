@@ -0,0 +1,39 @@
+import pytest
+from httpx import AsyncClient
+
+from RESTApi.db import database, post_table
+from RESTApi.db.commands import reconcile_like_counts
+
+
+@pytest.fixture()
+async def liked_post(async_client: AsyncClient, logged_in_token: str) -> dict:
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    post = (
+        await async_client.post("/post", json={"body": "Test"}, headers=headers)
+    ).json()
+    await async_client.post("/like", json={"post_id": post["id"]}, headers=headers)
+    return post
+
+
+async def get_like_count(post_id: int) -> int:
+    query = post_table.select().where(post_table.c.id == post_id)
+    return (await database.fetch_one(query)).like_count
+
+
+@pytest.mark.anyio
+async def test_reconcile_like_counts_in_sync(liked_post: dict):
+    assert await reconcile_like_counts() == 0
+    assert await get_like_count(liked_post["id"]) == 1
+
+
+@pytest.mark.anyio
+async def test_reconcile_like_counts_fixes_drift(liked_post: dict):
+    query = (
+        post_table.update()
+        .where(post_table.c.id == liked_post["id"])
+        .values(like_count=5)
+    )
+    await database.execute(query)
+
+    assert await reconcile_like_counts() == 1
+    assert await get_like_count(liked_post["id"]) == 1
@@ -0,0 +1,93 @@
+import pytest
+from asgi_correlation_id import correlation_id
+
+from RESTApi.db import comment_table, database
+from RESTApi.db.instrumented import OTHER, InstrumentedDatabase, normalize
+
+
+def test_normalize():
+    assert (
+        normalize("SELECT *\n  FROM posts WHERE id = :id_1 AND body = 'it''s'")
+        == "SELECT * FROM posts WHERE id = ? AND body = ?"
+    )
+    assert normalize("SELECT * FROM t WHERE id IN (1, 2, 3) LIMIT 10") == (
+        "SELECT * FROM t WHERE id IN (?) LIMIT ?"
+    )
+    assert normalize("SELECT post_id_1 FROM t") == "SELECT post_id_1 FROM t"
+
+
+def test_fingerprint_ignores_values():
+    by_id = [comment_table.select().where(comment_table.c.post_id == i) for i in (1, 2)]
+    in_lists = [
+        comment_table.select().where(comment_table.c.post_id.in_(ids))
+        for ids in ([1], [1, 2, 3])
+    ]
+    assert database.fingerprint(by_id[0]) == database.fingerprint(by_id[1])
+    assert database.fingerprint(in_lists[0]) == database.fingerprint(in_lists[1])
+    assert "IN (?)" in database.fingerprint(in_lists[0])
+
+
+@pytest.mark.anyio
+async def test_query_stats(tmp_path):
+    db = InstrumentedDatabase(f"sqlite:///{tmp_path / 'stats.db'}")
+    async with db:
+        await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        await db.execute_many(
+            "INSERT INTO items (name) VALUES (:name)", [{"name": "a"}, {"name": "b"}]
+        )
+        for _ in range(2):
+            rows = await db.fetch_all("SELECT * FROM items WHERE id > 0")
+        with pytest.raises(Exception):
+            await db.fetch_one("SELECT * FROM missing")
+
+    select = db.query_stats["SELECT * FROM items WHERE id > ?"]
+    assert select.calls == 2
+    assert select.rows == 2 * len(rows) == 4
+    assert db.query_stats["INSERT INTO items (name) VALUES (?)"].rows == 2
+    assert db.query_stats["SELECT * FROM missing"].errors == 1
+    assert db.top_queries(1)[0].total_seconds == max(
+        s.total_seconds for s in db.query_stats.values()
+    )
+
+
+@pytest.mark.anyio
+async def test_connection_counts(tmp_path):
+    db = InstrumentedDatabase(f"sqlite:///{tmp_path / 'connections.db'}")
+    async with db:
+        await db.fetch_one("SELECT 1")
+        await db.fetch_one("SELECT 1")
+        assert db.connections_opened == 2
+        assert db.connections_in_use == 0
+
+        async with db.connection():
+            await db.fetch_one("SELECT 1")
+            assert db.connections_in_use == 1
+        assert db.connections_opened == 3
+        assert db.connections_in_use == 0
+
+
+@pytest.mark.anyio
+async def test_slow_query_log(mocker):
+    logger = mocker.patch("RESTApi.db.instrumented.logger")
+    mocker.patch.object(database, "slow_query_seconds", 0)
+    token = correlation_id.set("request-1")
+    try:
+        await database.fetch_val("SELECT 42")
+    finally:
+        correlation_id.reset(token)
+
+    stats = database.query_stats["SELECT ?"]
+    assert stats.slow >= 1
+    assert stats.slowest_correlation_id == "request-1"
+    extra = logger.warning.call_args.kwargs["extra"]
+    assert extra["fingerprint"] == "SELECT ?"
+    assert extra["operation"] == "fetch_val"
+    assert extra["rows"] == 1
+
+
+def test_fingerprints_are_bounded():
+    db = InstrumentedDatabase("sqlite:///unused.db", max_fingerprints=2)
+    for table in ("a", "b", "c", "d"):
+        db.record("fetch_all", f"SELECT * FROM {table}", 0.01, 1)
+    assert set(db.query_stats) == {"SELECT * FROM a", "SELECT * FROM b", OTHER}
+    assert db.query_stats[OTHER].calls == 2
@@ -0,0 +1,66 @@
+import sqlite3
+from pathlib import Path
+
+import databases
+import pytest
+
+from RESTApi.db.migrations import (
+    MIGRATIONS,
+    SchemaOutdatedError,
+    check_schema,
+    migrate_url,
+)
+from RESTApi.db.setup import metadata
+
+
+@pytest.mark.anyio
+async def test_migrations_match_table_definitions(tmp_path: Path):
+    path = tmp_path / "fresh.db"
+    assert await migrate_url(f"sqlite:///{path}") == [m.version for m in MIGRATIONS]
+
+    with sqlite3.connect(path) as connection:
+        for table in metadata.sorted_tables:
+            columns = connection.execute(f"PRAGMA table_info({table.name})")
+            assert {row[1] for row in columns} == {c.name for c in table.columns}
+            indexes = connection.execute(f"PRAGMA index_list({table.name})")
+            assert {i.name for i in table.indexes} <= {row[1] for row in indexes}
+
+
+@pytest.mark.anyio
+async def test_migrate_is_idempotent(tmp_path: Path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    await migrate_url(url)
+    assert await migrate_url(url) == []
+
+
+@pytest.mark.anyio
+async def test_check_schema(tmp_path: Path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    async with databases.Database(url) as db:
+        with pytest.raises(SchemaOutdatedError, match="RESTApi.db migrate"):
+            await check_schema(db)
+    await migrate_url(url)
+    async with databases.Database(url) as db:
+        await check_schema(db)
+
+
+@pytest.mark.anyio
+async def test_migrate_database_created_by_create_all(tmp_path: Path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript("""
+            CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR, password VARCHAR,
+                confirmed BOOLEAN, PRIMARY KEY (id), UNIQUE (email));
+            CREATE TABLE posts (id INTEGER NOT NULL, body VARCHAR,
+                user_id INTEGER NOT NULL, PRIMARY KEY (id));
+            CREATE TABLE likes (id INTEGER NOT NULL, post_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL, PRIMARY KEY (id));
+            INSERT INTO posts VALUES (1, 'Test Post', 1);
+            INSERT INTO likes VALUES (1, 1, 1), (2, 1, 1);
+            """)
+
+    await migrate_url(f"sqlite:///{path}")
+
+    with sqlite3.connect(path) as connection:
+        like_count = connection.execute("SELECT like_count FROM posts").fetchone()
+        assert like_count == (2,)
@@ -0,0 +1,123 @@
+"""Runs EXPLAIN QUERY PLAN on every query the routers issue while serving
+the hot endpoints and fails if any of them falls back to a full table scan.
+"""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql import ClauseElement
+
+from RESTApi.db import database
+from RESTApi.db.commands import reconcile_like_counts
+
+
+def compile_query(query: ClauseElement) -> str:
+    return str(
+        query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    )
+
+
+# (query, plan step) of the scans that are meant to be there, every other
+# step starting with SCAN fails, with or without an index
+ALLOWED_SCANS: tuple[tuple[str, str], ...] = (
+    # first page of new/old, walks the primary key in order, stops at LIMIT
+    ("FROM posts ORDER BY posts.id DESC LIMIT ", "SCAN posts"),
+    ("FROM posts ORDER BY posts.id ASC LIMIT ", "SCAN posts"),
+    # first page of most_likes, walks the index in order, stops at LIMIT
+    (
+        "FROM posts ORDER BY posts.like_count DESC, posts.id DESC LIMIT ",
+        "SCAN posts USING INDEX ix_posts_like_count_id",
+    ),
+    # reconcile_like_counts checks every post on purpose
+    (
+        "SELECT count(*) AS count_1 FROM posts WHERE posts.like_count != ",
+        "SCAN posts USING COVERING INDEX ix_posts_like_count_id",
+    ),
+)
+
+
+def full_scans(sql: str, plan: list[str]) -> list[str]:
+    """Plan steps that read a whole table or index, except ALLOWED_SCANS."""
+    sql = " ".join(sql.split())
+    return [
+        step
+        for step in plan
+        if step.startswith("SCAN ")
+        and step != "SCAN CONSTANT ROW"
+        and not any(
+            query in sql and step == allowed for query, allowed in ALLOWED_SCANS
+        )
+    ]
+
+
+@pytest.fixture()
+def issued_queries(mocker) -> list[ClauseElement]:
+    """Records every SQLAlchemy query sent through the shared database."""
+    spies = [
+        mocker.spy(database, method)
+        for method in ("fetch_all", "fetch_one", "fetch_val", "execute")
+    ]
+
+    def collect() -> list[ClauseElement]:
+        return [
+            call.args[0]
+            for spy in spies
+            for call in spy.call_args_list
+            if isinstance(call.args[0], ClauseElement)
+        ]
+
+    return collect
+
+
+@pytest.mark.anyio
+async def test_hot_queries_use_indexes(
+    async_client: AsyncClient, logged_in_token: str, issued_queries
+):
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    for body in ("Test Post 1", "Test Post 2", "Test Post 3"):
+        await async_client.post("/post", json={"body": body}, headers=headers)
+    await async_client.post(
+        "/comment", json={"body": "c", "post_id": 1}, headers=headers
+    )
+    await async_client.post("/like", json={"post_id": 2}, headers=headers)
+    await async_client.post(
+        "/comment/bulk", json=[{"body": "c", "post_id": 2}], headers=headers
+    )
+    await async_client.post("/like/bulk", json=[{"post_id": 3}], headers=headers)
+
+    for sorting in ("new", "old", "most_likes"):
+        response = await async_client.get(
+            "/post", params={"sorting": sorting, "limit": 1}
+        )
+        await async_client.get(
+            "/post",
+            params={
+                "sorting": sorting,
+                "limit": 1,
+                "cursor": response.headers["X-Next-Cursor"],
+            },
+        )
+    await async_client.get("/post/1/comment")
+    await async_client.get("/post/1")
+    await reconcile_like_counts()
+
+    queries = issued_queries()
+    assert queries
+
+    failures = []
+    for query in queries:
+        sql = compile_query(query)
+        rows = await database.fetch_all(f"EXPLAIN QUERY PLAN {sql}")
+        plan = [row.detail for row in rows]
+        if scans := full_scans(sql, plan):
+            failures.append(f"{sql}\n    -> {scans}")
+
+    assert not failures, "Full table scans:\n" + "\n".join(failures)
+
+
+def test_full_scans_only_allows_listed_scans():
+    page = "SELECT posts.id FROM posts ORDER BY posts.id DESC LIMIT 2 OFFSET 0"
+    assert full_scans(page, ["SCAN posts"]) == []
+    assert full_scans("SELECT * FROM posts LIMIT 2", ["SCAN posts"]) == ["SCAN posts"]
+    step = "SCAN comments USING INDEX ix_comments_post_id"
+    assert full_scans("SELECT * FROM comments", [step]) == [step]
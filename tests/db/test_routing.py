@@ -0,0 +1,102 @@
+import sqlite3
+import time
+from pathlib import Path
+
+import databases
+import pytest
+from httpx import AsyncClient
+
+from RESTApi.db import database, read_database, routing
+from RESTApi.db.routing import copy_database, reader, replica_reads
+from RESTApi.response_cache import response_cache
+
+
+def test_reader_defaults_to_primary():
+    assert reader() is database
+
+
+def test_reader_inside_replica_reads():
+    with replica_reads():
+        assert reader() is read_database
+    assert reader() is database
+
+
+def test_copy_database(tmp_path: Path):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    with sqlite3.connect(primary) as connection:
+        connection.execute("CREATE TABLE t (x INTEGER)")
+        connection.execute("INSERT INTO t VALUES (1)")
+
+    copy_database(str(primary), str(replica))
+
+    with sqlite3.connect(replica) as connection:
+        assert connection.execute("SELECT x FROM t").fetchall() == [(1,)]
+
+
+@pytest.fixture()
+async def replica(tmp_path: Path, mocker):
+    """A copy of the test database holding one post the primary does not have."""
+    replica_path = tmp_path / "replica.db"
+    copy_database(database.url.database, str(replica_path))
+    with sqlite3.connect(replica_path) as connection:
+        connection.execute(
+            "INSERT INTO posts (id, body, user_id) VALUES (1, 'From replica', 1)"
+        )
+
+    replica = databases.Database(f"sqlite:///{replica_path}")
+    await replica.connect()
+    mocker.patch.object(routing, "read_database", replica)
+    yield replica
+    await replica.disconnect()
+
+
+@pytest.mark.anyio
+async def test_get_requests_read_from_replica(
+    async_client: AsyncClient, logged_in_token: str, replica, mocker
+):
+    mocker.patch.object(response_cache, "backend", None)
+    response = await async_client.get("/post")
+    assert [post["body"] for post in response.json()] == ["From replica"]
+
+
+@pytest.mark.anyio
+async def test_cached_responses_read_from_primary(
+    async_client: AsyncClient, logged_in_token: str, replica
+):
+    # a lagging replica must not be cached for the whole ttl
+    response = await async_client.get("/post")
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_cache_filled_from_replica_synced_after_invalidation(
+    async_client: AsyncClient, logged_in_token: str, replica, mocker
+):
+    await response_cache.invalidate("posts:new")
+    mocker.patch.object(routing, "replica_synced_at", time.time() + 1)
+    response = await async_client.get("/post")
+    assert [post["body"] for post in response.json()] == ["From replica"]
+
+
+@pytest.mark.anyio
+async def test_cache_not_filled_from_replica_older_than_invalidation(
+    async_client: AsyncClient, logged_in_token: str, replica, mocker
+):
+    mocker.patch.object(routing, "replica_synced_at", time.time() - 1)
+    await response_cache.invalidate("posts:new")
+    response = await async_client.get("/post")
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_writes_go_to_primary(
+    async_client: AsyncClient, logged_in_token: str, replica
+):
+    await async_client.post(
+        "/post",
+        json={"body": "On primary"},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    query = "SELECT body FROM posts"
+    assert [row.body for row in await database.fetch_all(query)] == ["On primary"]
+    assert [row.body for row in await replica.fetch_all(query)] == ["From replica"]
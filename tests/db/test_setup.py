@@ -0,0 +1,24 @@
+import pytest
+
+from RESTApi.config import TestConfing
+from RESTApi.db import database
+from RESTApi.db.setup import sqlite_pragmas, sqlite_settings
+
+
+def test_sqlite_pragmas():
+    config = TestConfing(SQLITE_JOURNAL_MODE="DELETE", SQLITE_CACHE_SIZE=-1024)
+    pragmas = sqlite_pragmas(config)
+    assert "PRAGMA journal_mode = DELETE" in pragmas
+    assert "PRAGMA cache_size = -1024" in pragmas
+    assert "PRAGMA foreign_keys = ON" in pragmas
+
+
+@pytest.mark.anyio
+async def test_sqlite_settings_applied_on_connect():
+    settings = await sqlite_settings(database)
+    assert settings["journal_mode"] == "wal"
+    assert settings["synchronous"] == 1
+    assert settings["cache_size"] == -65536
+    assert settings["temp_store"] == 2
+    assert settings["busy_timeout"] == 5000
+    assert settings["foreign_keys"] == 1
@@ -0,0 +1,170 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from RESTApi.config import config
+from RESTApi.download import IMMUTABLE, BlobResponse, parse_range
+
+CONTENT = bytes(range(256)) * 400
+
+
+pytestmark = pytest.mark.usefixtures("upload_directories")
+
+
+@pytest.fixture()
+async def file_url(async_client: AsyncClient) -> str:
+    response = await async_client.post(
+        "/upload/stream", files={"file": ("clip.mp4", CONTENT, "video/mp4")}
+    )
+    return response.json()["file_url"]
+
+
+@pytest.mark.anyio
+async def test_download(async_client: AsyncClient, file_url: str):
+    response = await async_client.get(file_url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.headers["etag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["accept-ranges"] == "bytes"
+    # the blob may be shared with other uploads, their filenames stay private
+    assert "content-disposition" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_download_head(async_client: AsyncClient, file_url: str):
+    response = await async_client.head(file_url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(CONTENT))
+
+
+@pytest.mark.anyio
+async def test_download_range(async_client: AsyncClient, file_url: str):
+    response = await async_client.get(file_url, headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+
+@pytest.mark.anyio
+async def test_download_range_not_satisfiable(async_client: AsyncClient, file_url):
+    response = await async_client.get(
+        file_url, headers={"Range": f"bytes={len(CONTENT)}-"}
+    )
+
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.anyio
+async def test_download_range_without_dash_sends_whole_file(
+    async_client: AsyncClient, file_url: str
+):
+    response = await async_client.get(file_url, headers={"Range": "bytes=5"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == CONTENT
+
+
+@pytest.mark.anyio
+async def test_download_shared_blob_hides_filenames(async_client: AsyncClient):
+    await async_client.post(
+        "/upload/stream", files={"file": ("private-name.mp4", CONTENT, "video/mp4")}
+    )
+    response = await async_client.post(
+        "/upload/stream", files={"file": ("other.mp4", CONTENT, "video/mp4")}
+    )
+
+    download = await async_client.get(response.json()["file_url"])
+
+    assert download.status_code == status.HTTP_200_OK
+    assert "private-name" not in str(download.headers)
+
+
+@pytest.mark.anyio
+async def test_download_if_range_mismatch_sends_whole_file(
+    async_client: AsyncClient, file_url: str
+):
+    response = await async_client.get(
+        file_url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == CONTENT
+
+
+@pytest.mark.anyio
+async def test_download_not_modified(async_client: AsyncClient, file_url: str):
+    etag = (await async_client.head(file_url)).headers["etag"]
+
+    response = await async_client.get(file_url, headers={"If-None-Match": etag})
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+
+@pytest.mark.anyio
+async def test_download_accel_redirect(async_client: AsyncClient, file_url, mocker):
+    mocker.patch.object(config, "DOWNLOAD_ACCEL_REDIRECT_PREFIX", "/_blobs")
+    digest = file_url.rsplit("/", 1)[1]
+
+    response = await async_client.get(file_url)
+
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == (
+        f"/_blobs/{digest[:2]}/{digest[2:4]}/{digest}"
+    )
+
+
+@pytest.mark.anyio
+async def test_download_unknown_digest(async_client: AsyncClient):
+    response = await async_client.get(f"/uploads/{'0' * 64}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=50-500", (50, 99)),
+        ("bytes=0-1,5-6", None),
+        ("bytes=5", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.anyio
+async def test_zero_copy_send(tmp_path: Path):
+    path = tmp_path / "blob"
+    path.write_bytes(CONTENT)
+    messages = []
+    sent = []
+
+    async def send(message):
+        messages.append(message)
+        if "file" in message:
+            sent.append(os.pread(message["file"].fileno(), 10, 10))
+
+    response = BlobResponse(path, len(CONTENT), "video/mp4", {}, (10, 19))
+    scope = {"method": "GET", "extensions": {"http.response.zerocopysend": {}}}
+    await response(scope, None, send)
+
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert (messages[1]["offset"], messages[1]["count"]) == (10, 10)
+    assert sent == [CONTENT[10:20]]
+    assert messages[1]["file"].closed
@@ -1,8 +1,11 @@
 import pytest
 from fastapi import status
 from httpx import AsyncClient, Response
+from pydantic import TypeAdapter
 from starlette.status import HTTP_201_CREATED
 
+from RESTApi.models import UserPost
+from RESTApi.models.post import Comment, UserPostWithComments
 from RESTApi.security import create_access_token
 
 
@@ -198,3 +201,257 @@ async def test_like_post(
         headers={"Authorization": f"Bearer {logged_in_token}"},
     )
     assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.anyio
+async def test_like_post_increments_like_count(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str
+):
+    await like_post(created_post["id"], async_client, logged_in_token)
+    await like_post(created_post["id"], async_client, logged_in_token)
+
+    response: Response = await async_client.get(f"/post/{created_post['id']}")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["post"]["likes"] == 2
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "sorting, expected_order",
+    [("new", [3, 2, 1]), ("old", [1, 2, 3]), ("most_likes", [2, 3, 1])],
+)
+async def test_get_all_posts_pagination(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sorting: str,
+    expected_order: list[int],
+):
+    for body in ("Test Post 1", "Test Post 2", "Test Post 3"):
+        await create_post(body, async_client, logged_in_token)
+    await like_post(2, async_client, logged_in_token)
+
+    post_ids = []
+    params = {"sorting": sorting, "limit": 2}
+    while True:
+        response: Response = await async_client.get("/post", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) <= 2
+        post_ids += [post["id"] for post in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert post_ids == expected_order
+
+
+@pytest.mark.anyio
+async def test_get_all_posts_last_page_has_no_cursor(
+    async_client: AsyncClient, created_post: dict
+):
+    response: Response = await async_client.get("/post", params={"limit": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_get_all_posts_invalid_cursor(async_client: AsyncClient):
+    response: Response = await async_client.get("/post", params={"cursor": "nope"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_get_all_posts_cursor_key_too_short(async_client: AsyncClient):
+    # {"s":"most_likes","k":[1]}, most_likes keys are [likes, id]
+    response: Response = await async_client.get(
+        "/post",
+        params={
+            "sorting": "most_likes",
+            "cursor": "eyJzIjoibW9zdF9saWtlcyIsImsiOlsxXX0",
+        },
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_get_all_posts_cursor_of_other_sorting(
+    async_client: AsyncClient, logged_in_token: str
+):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    response: Response = await async_client.get(
+        "/post", params={"sorting": "new", "limit": 1}
+    )
+
+    response = await async_client.get(
+        "/post",
+        params={"sorting": "old", "cursor": response.headers["X-Next-Cursor"]},
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_create_comment_post_not_found(
+    async_client: AsyncClient, logged_in_token: str
+):
+    response: Response = await async_client.post(
+        "/comment",
+        json={"body": "Test Comment", "post_id": 2},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_get_post_with_comments_not_found(async_client: AsyncClient):
+    response: Response = await async_client.get("/post/2")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_get_post_with_many_comments(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str
+):
+    comments = [
+        await create_comment(body, created_post["id"], async_client, logged_in_token)
+        for body in ("Comment 1", "Comment 2")
+    ]
+    response: Response = await async_client.get(f"/post/{created_post['id']}")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["comments"] == comments
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "url, model",
+    [
+        ("/post", list[UserPost]),
+        ("/post/{post_id}/comment", list[Comment]),
+        ("/post/{post_id}", UserPostWithComments),
+    ],
+)
+async def test_read_routes_match_pydantic_json(
+    async_client: AsyncClient, logged_in_token: str, url: str, model
+):
+    # the bodies are dumped from the rows, byte for byte what pydantic would send
+    body = 'Quote " backslash \\ newline \n tab \t \x01 ünïcode 🙂'
+    post = await create_post(body, async_client, logged_in_token)
+    await create_comment(body, post["id"], async_client, logged_in_token)
+    await like_post(post["id"], async_client, logged_in_token)
+
+    response: Response = await async_client.get(url.format(post_id=post["id"]))
+
+    adapter = TypeAdapter(model)
+    assert response.content == adapter.dump_json(
+        adapter.validate_json(response.content)
+    )
+
+
+@pytest.mark.anyio
+async def test_like_post_not_found(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str
+):
+    response: Response = await async_client.post(
+        "/like",
+        json={"post_id": 2},
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_create_posts_bulk(
+    async_client: AsyncClient, confirmed_user: dict, logged_in_token: str
+):
+    response: Response = await async_client.post(
+        "/post/bulk",
+        json=[{"body": "Test Post 1"}, {"body": "Test Post 2"}],
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert [item["id"] for item in response.json()] == [1, 2]
+
+    response = await async_client.get("/post", params={"sorting": "old"})
+    assert response.json() == [
+        {"id": 1, "body": "Test Post 1", "user_id": confirmed_user["id"]},
+        {"id": 2, "body": "Test Post 2", "user_id": confirmed_user["id"]},
+    ]
+
+
+@pytest.mark.anyio
+async def test_create_posts_bulk_empty(async_client: AsyncClient, logged_in_token: str):
+    response: Response = await async_client.post(
+        "/post/bulk", json=[], headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_create_comments_bulk_post_not_found(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str
+):
+    response: Response = await async_client.post(
+        "/comment/bulk",
+        json=[
+            {"body": "Comment 1", "post_id": created_post["id"]},
+            {"body": "Comment 2", "post_id": 99},
+            {"body": "Comment 3", "post_id": created_post["id"]},
+        ],
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert [(item["status_code"], item["id"]) for item in response.json()] == [
+        (201, 1),
+        (404, None),
+        (201, 2),
+    ]
+
+    response = await async_client.get(f"/post/{created_post['id']}/comment")
+    assert [comment["body"] for comment in response.json()] == [
+        "Comment 1",
+        "Comment 3",
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "url, item",
+    [
+        ("/comment/bulk", {"body": "Comment", "post_id": 99}),
+        ("/like/bulk", {"post_id": 99}),
+    ],
+)
+async def test_bulk_post_deleted_during_batch(
+    async_client: AsyncClient, logged_in_token: str, mocker, url: str, item: dict
+):
+    # the post existed when looked up, and was gone by the INSERT
+    mocker.patch(
+        "RESTApi.routers.main.routers.find_existing_post_ids", return_value={99}
+    )
+    response: Response = await async_client.post(
+        url, json=[item], headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+@pytest.mark.anyio
+async def test_like_posts_bulk(async_client: AsyncClient, logged_in_token: str):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    response: Response = await async_client.post(
+        "/like/bulk",
+        json=[{"post_id": 2}, {"post_id": 1}, {"post_id": 2}, {"post_id": 3}],
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+    )
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert [item["status_code"] for item in response.json()] == [201, 201, 201, 404]
+
+    response = await async_client.get("/post/2")
+    assert response.json()["post"]["likes"] == 2
+    response = await async_client.get("/post", params={"sorting": "most_likes"})
+    assert [post["id"] for post in response.json()] == [2, 1]
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -6,11 +7,14 @@ import pytest
 from fastapi import status
 from httpx import AsyncClient, Response
 
+from RESTApi.db import database, upload_table
+from RESTApi.storage import blob_path, blob_url
+
 
 @pytest.fixture()
 def sample_image(fs) -> Path:
     path = (Path.cwd() / "RESTApi" / "static" / "myfile.png").resolve()
-    fs.create_file(path)
+    fs.create_file(path, contents=b"\x89PNG sample image")
     return path
 
 
@@ -24,7 +28,7 @@ def aiofiles_mock_open(mocker):
         with open(fname, mode) as fin:
             out_fs_mock.read.side_effect = fin.read
             out_fs_mock.write.side_effect = fin.write
-        yield out_fs_mock
+            yield out_fs_mock
 
     mock_open.side_effect = async_file_open
     return mock_open
@@ -48,10 +52,30 @@ async def test_upload_image(
         async_client, logged_in_token, sample_image
     )
     assert response.status_code == status.HTTP_201_CREATED
-    assert (
-        response.json()["file_url"]
-        == f"/static/uploads/{sample_image.stem}{sample_image.suffix}"
-    )
+    digest = hashlib.sha256(sample_image.read_bytes()).hexdigest()
+    assert response.json()["file_url"] == blob_url(digest)
+    assert response.json()["content_type"] == "image/png"
+    assert blob_path(digest).read_bytes() == sample_image.read_bytes()
+    assert blob_path(digest).parent.parent.name == digest[:2]
+
+
+@pytest.mark.anyio
+async def test_upload_same_content_is_stored_once(
+    async_client: AsyncClient,
+    logged_in_token: str,
+    sample_image: Path,
+    aiofiles_mock_open,
+):
+    first = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+    second = await call_upload_endpoint(async_client, logged_in_token, sample_image)
+
+    assert first.json()["created"] is True
+    assert second.json()["created"] is False
+    assert first.json()["digest"] == second.json()["digest"]
+    assert aiofiles_mock_open.call_count == 1
+    # both uploads are recorded
+    rows = await database.fetch_all(upload_table.select())
+    assert [row.filename for row in rows] == ["myfile.png", "myfile.png"]
 
 
 @pytest.mark.anyio
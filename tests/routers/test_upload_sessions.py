@@ -0,0 +1,194 @@
+import hashlib
+import os
+import time
+
+import pytest
+from fastapi import HTTPException, status
+from httpx import AsyncClient
+
+from RESTApi import resumable, storage
+from RESTApi.config import config
+from RESTApi.storage import blob_path
+
+CONTENT = b"resumable upload content " * 100
+OCTETS = {"Content-Type": "application/offset+octet-stream"}
+
+
+pytestmark = pytest.mark.usefixtures("upload_directories")
+
+
+@pytest.fixture()
+async def session_url(async_client: AsyncClient) -> str:
+    response = await async_client.post(
+        "/upload/sessions", json={"filename": "video.mp4", "size": len(CONTENT)}
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.headers["Location"]
+
+
+async def patch(async_client: AsyncClient, url: str, offset: int, body: bytes):
+    return await async_client.patch(
+        url, content=body, headers={**OCTETS, "Upload-Offset": str(offset)}
+    )
+
+
+@pytest.mark.anyio
+async def test_create_session(async_client: AsyncClient, session_url: str):
+    response = await async_client.head(session_url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Upload-Offset"] == "0"
+    assert response.headers["Upload-Length"] == str(len(CONTENT))
+
+
+@pytest.mark.anyio
+async def test_create_session_too_large(async_client: AsyncClient):
+    response = await async_client.post(
+        "/upload/sessions",
+        json={"filename": "big.bin", "size": config.UPLOAD_MAX_BYTES + 1},
+    )
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.anyio
+async def test_upload_in_chunks(async_client: AsyncClient, session_url: str):
+    first = await patch(async_client, session_url, 0, CONTENT[:1000])
+    assert first.status_code == status.HTTP_204_NO_CONTENT
+    assert first.headers["Upload-Offset"] == "1000"
+
+    offset = await async_client.head(session_url)
+    assert offset.headers["Upload-Offset"] == "1000"
+
+    last = await patch(async_client, session_url, 1000, CONTENT[1000:])
+    assert last.status_code == status.HTTP_201_CREATED
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert last.json()["digest"] == digest
+    assert last.json()["content_type"] == "video/mp4"
+    assert blob_path(digest).read_bytes() == CONTENT
+    # the session is gone once finalized
+    gone = await async_client.head(session_url)
+    assert gone.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_patch_wrong_offset(async_client: AsyncClient, session_url: str):
+    await patch(async_client, session_url, 0, CONTENT[:10])
+
+    response = await patch(async_client, session_url, 5, CONTENT[5:20])
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.headers["Upload-Offset"] == "10"
+
+
+@pytest.mark.anyio
+async def test_patch_past_upload_length(async_client: AsyncClient, session_url: str):
+    response = await patch(async_client, session_url, 0, CONTENT + b"extra")
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.anyio
+async def test_patch_requires_offset_content_type(
+    async_client: AsyncClient, session_url: str
+):
+    response = await async_client.patch(
+        session_url,
+        content=CONTENT,
+        headers={"Content-Type": "text/plain", "Upload-Offset": "0"},
+    )
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+@pytest.mark.anyio
+async def test_interrupted_patch_keeps_received_bytes(session_url: str):
+    session = await resumable.get_session(session_url.rsplit("/", 1)[1])
+
+    async def dropped_connection():
+        yield CONTENT[:100]
+        raise ConnectionResetError
+
+    with pytest.raises(ConnectionResetError):
+        await resumable.append(session, 0, dropped_connection())
+
+    session = await resumable.get_session(session.id)
+    assert session.upload_offset == 100
+
+
+@pytest.mark.anyio
+async def test_patch_while_claimed_elsewhere(
+    async_client: AsyncClient, session_url: str
+):
+    # a PATCH on another worker holds the session
+    session = await resumable.get_session(session_url.rsplit("/", 1)[1])
+    claim_token = await resumable.claim(session, 0)
+
+    response = await patch(async_client, session_url, 0, CONTENT[:10])
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    await resumable.release(session.id, claim_token, 0, 0)
+    response = await patch(async_client, session_url, 0, CONTENT[:10])
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+@pytest.mark.anyio
+async def test_dead_claim_is_taken_over(session_url: str, monkeypatch):
+    session = await resumable.get_session(session_url.rsplit("/", 1)[1])
+    dead_token = await resumable.claim(session, 0)
+    monkeypatch.setattr(config, "UPLOAD_PATCH_TIMEOUT_SECONDS", -1)
+
+    async def chunks():
+        yield CONTENT[:10]
+
+    assert await resumable.append(session, 0, chunks()) == (10, None)
+    # the dead PATCH cannot record its offset over the new one
+    with pytest.raises(HTTPException) as e:
+        await resumable.release(session.id, dead_token, 0, 5)
+    assert e.value.status_code == status.HTTP_409_CONFLICT
+    assert (await resumable.get_session(session.id)).upload_offset == 10
+
+
+@pytest.mark.anyio
+async def test_last_patch_finalizes_under_claim(
+    async_client: AsyncClient, session_url: str, mocker
+):
+    session = await resumable.get_session(session_url.rsplit("/", 1)[1])
+    retried = {}
+
+    async def hash_partial(session_id: str) -> str:
+        # a retried last PATCH arrives while the first one hashes
+        retried["response"] = await patch(async_client, session_url, len(CONTENT), b"")
+        return hashlib.sha256(CONTENT).hexdigest()
+
+    mocker.patch.object(resumable, "hash_partial", hash_partial)
+
+    async def chunks():
+        yield CONTENT
+
+    new_offset, blob = await resumable.append(session, 0, chunks())
+    assert new_offset == len(CONTENT)
+    assert blob.digest == hashlib.sha256(CONTENT).hexdigest()
+    assert retried["response"].status_code == status.HTTP_409_CONFLICT
+    with pytest.raises(HTTPException):
+        await resumable.get_session(session.id)
+
+
+@pytest.mark.anyio
+async def test_delete_session(async_client: AsyncClient, session_url: str):
+    response = await async_client.delete(session_url)
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert not any(storage.PARTIAL_DIRECTORY.glob("*"))
+
+
+@pytest.mark.anyio
+async def test_collect_abandoned_uploads(session_url: str):
+    stale = storage.PARTIAL_DIRECTORY / "leftover-stream"
+    stale.touch()
+    long_ago = time.time() - 2 * config.UPLOAD_SESSION_TTL_SECONDS
+    os.utime(stale, (long_ago, long_ago))
+
+    # the session is still live
+    assert await resumable.collect_abandoned_uploads() == 1
+
+    later = time.time() + 2 * config.UPLOAD_SESSION_TTL_SECONDS
+    assert await resumable.collect_abandoned_uploads(now=later) == 1
+    assert not any(storage.PARTIAL_DIRECTORY.glob("*"))
@@ -0,0 +1,104 @@
+import hashlib
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from RESTApi import storage
+from RESTApi.config import config
+from RESTApi.routers.upload import routers
+from RESTApi.storage import blob_path, blob_url
+
+CONTENT = b"\x89PNG streamed image" * 1000
+
+
+pytestmark = pytest.mark.usefixtures("upload_directories")
+
+
+async def stream(async_client: AsyncClient, content: bytes = CONTENT, **kwargs):
+    return await async_client.post(
+        "/upload/stream",
+        files={"file": ("image.png", content, "application/octet-stream")},
+        **kwargs,
+    )
+
+
+@pytest.mark.anyio
+async def test_stream_upload(async_client: AsyncClient):
+    response = await stream(async_client)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert response.json()["file_url"] == blob_url(digest)
+    assert response.json()["content_type"] == "image/png"
+    assert blob_path(digest).read_bytes() == CONTENT
+    assert not any(storage.PARTIAL_DIRECTORY.glob("*"))
+
+
+@pytest.mark.anyio
+async def test_stream_upload_deduplicates(async_client: AsyncClient):
+    first = await stream(async_client)
+    second = await stream(async_client)
+
+    assert first.json()["created"] is True
+    assert second.json()["created"] is False
+    assert not any(storage.PARTIAL_DIRECTORY.glob("*"))
+
+
+@pytest.mark.anyio
+async def test_stream_upload_rejects_content_length(async_client: AsyncClient, mocker):
+    mocker.patch.object(config, "UPLOAD_MAX_BYTES", 10)
+    write = mocker.spy(storage.BlobWriter, "write")
+
+    response = await stream(async_client, content=b"x" * (20 * 1024))
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    write.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_stream_upload_rejects_invalid_content_length(
+    async_client: AsyncClient, mocker
+):
+    write = mocker.spy(storage.BlobWriter, "write")
+
+    response = await async_client.post(
+        "/upload/stream", content=b"x" * 100, headers={"Content-Length": "lots"}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    write.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_stream_upload_enforces_size_while_streaming(
+    async_client: AsyncClient, mocker
+):
+    # within the multipart overhead allowed for Content-Length
+    mocker.patch.object(config, "UPLOAD_MAX_BYTES", len(CONTENT) - 1)
+
+    response = await stream(async_client)
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert not any(storage.PARTIAL_DIRECTORY.glob("*"))
+    assert not storage.UPLOAD_DIRECTORY.exists()
+
+
+@pytest.mark.anyio
+async def test_stream_upload_without_file(async_client: AsyncClient):
+    response = await async_client.post(
+        "/upload/stream", files={"other": ("a.txt", b"data")}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_stream_upload_concurrency_limit(async_client: AsyncClient, mocker):
+    mocker.patch.object(routers.upload_limit, "limit", 0)
+    mocker.patch.object(routers.upload_limit, "queue_timeout", 0)
+    mocker.patch.object(routers.upload_limit, "_semaphore", None)
+
+    response = await stream(async_client)
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
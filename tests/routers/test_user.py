@@ -2,6 +2,9 @@ import pytest
 from fastapi import Request, status
 from httpx import AsyncClient, Response
 
+from RESTApi.pool import PoolSaturatedError
+from RESTApi.security import user_cache
+
 
 async def register_user(
     async_client: AsyncClient, email: str, password: str
@@ -40,6 +43,16 @@ async def test_confirm_user(async_client: AsyncClient, mocker):
     assert "User confirmed" in response.json()["detail"]
 
 
+@pytest.mark.anyio
+async def test_confirm_user_invalidates_cached_user(async_client: AsyncClient, mocker):
+    spy = mocker.spy(Request, "url_for")
+    await register_user(async_client, "test@example.net", "1234")
+    user_cache.set("test@example.net", {"confirmed": False})
+    await async_client.get(f"{spy.spy_return}")
+
+    assert user_cache.get("test@example.net") is None
+
+
 @pytest.mark.anyio
 async def test_confirm_user_invalid_token(async_client: AsyncClient):
     response: Request = await async_client.get("/confirm/invalid_token")
@@ -90,3 +103,12 @@ async def test_login_user(async_client: AsyncClient, confirmed_user: dict):
         },
     )
     assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.anyio
+async def test_register_user_password_pool_saturated(async_client: AsyncClient, mocker):
+    mocker.patch(
+        "RESTApi.security.password_pool.run", side_effect=PoolSaturatedError("test")
+    )
+    response: Response = await register_user(async_client, "test@example.net", "1234")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -0,0 +1,55 @@
+from RESTApi.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self) -> None:
+        self.now: float = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_set():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1}
+
+
+def test_entries_expire():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_entry_ttl_cannot_exceed_cache_ttl():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1, ttl=100)
+    cache.set("b", 2, ttl=1)
+    timer.now = 5
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_invalidate():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
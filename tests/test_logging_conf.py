@@ -0,0 +1,148 @@
+import logging
+import threading
+
+import pytest
+
+from RESTApi.logging_conf import (
+    BoundedQueueHandler,
+    configure_logging,
+    enqueue_handlers,
+    stop_logging,
+)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+        self.threads: set[str] = set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+        self.records.append(record)
+        self.threads.add(threading.current_thread().name)
+
+
+class Lazy:
+    """Stands for a query, whose str() is the expensive part."""
+
+    def __init__(self) -> None:
+        self.rendered_in: str | None = None
+
+    def __str__(self) -> str:
+        self.rendered_in = threading.current_thread().name
+        return "SELECT 1"
+
+
+def record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+@pytest.fixture()
+def logger():
+    logger = logging.getLogger("tests.queued")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger
+    logger.handlers.clear()
+
+
+def test_records_are_formatted_by_the_listener(logger):
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    listeners = enqueue_handlers([logger], maxsize=100, overflow="block")
+
+    query = Lazy()
+    logger.debug(query)
+    for listener in listeners:
+        listener.stop()
+
+    assert query.rendered_in != threading.current_thread().name
+    assert [r.getMessage() for r in handler.records] == ["SELECT 1"]
+    assert threading.current_thread().name not in handler.threads
+    assert isinstance(logger.handlers[0], BoundedQueueHandler)
+
+
+def test_filters_run_in_the_logging_thread(logger):
+    handler = RecordingHandler()
+    seen = []
+    handler.addFilter(lambda r: seen.append(threading.current_thread().name) or True)
+    logger.addHandler(handler)
+    listeners = enqueue_handlers([logger], maxsize=100, overflow="block")
+
+    logger.info("message")
+    for listener in listeners:
+        listener.stop()
+
+    assert seen == [threading.current_thread().name]
+
+
+def test_handler_shared_by_loggers_gets_one_queue(logger):
+    other = logging.getLogger("tests.queued.other")
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    other.addHandler(handler)
+
+    listeners = enqueue_handlers([logger, other], maxsize=100, overflow="block")
+    for listener in listeners:
+        listener.stop()
+
+    assert len(listeners) == 1
+    assert logger.handlers == other.handlers
+    other.handlers.clear()
+
+
+def test_drop_new():
+    handler = BoundedQueueHandler(maxsize=1, overflow="drop_new")
+    handler.handle(record("first"))
+    handler.handle(record("second"))
+
+    assert handler.queue.get_nowait().msg == "first"
+    assert handler.dropped == 1
+
+
+def test_drop_oldest():
+    handler = BoundedQueueHandler(maxsize=1, overflow="drop_oldest")
+    handler.handle(record("first"))
+    handler.handle(record("second"))
+
+    assert handler.queue.get_nowait().msg == "second"
+    assert handler.dropped == 1
+
+
+def queued_loggers() -> list[str]:
+    names = ("uvicorn", "uvicorn.access", "uvicorn.error", "RESTApi", "databases")
+    return [
+        name
+        for name in names
+        for handler in logging.getLogger(name).handlers
+        if isinstance(handler, BoundedQueueHandler)
+    ]
+
+
+def test_stop_logging_restores_handlers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    configure_logging()
+    assert queued_loggers()
+
+    stop_logging()
+
+    assert queued_loggers() == []
+    handler = logging.getLogger("RESTApi").handlers[0]
+    assert [type(f).__name__ for f in handler.filters] == [
+        "CorrelationIdFilter",
+        "EmailObfuscationFilter",
+    ]
+
+
+def test_configure_logging_twice(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    try:
+        configure_logging()
+        configure_logging()
+        handlers = logging.getLogger("RESTApi").handlers
+        assert len(handlers) == 2
+        assert all(isinstance(h, BoundedQueueHandler) for h in handlers)
+        assert not any(isinstance(h.target, BoundedQueueHandler) for h in handlers)
+    finally:
+        stop_logging()
@@ -0,0 +1,125 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from PIL import Image
+
+from RESTApi import storage
+from RESTApi.db import database, media_job_table
+from RESTApi.media import FAILED, QUEUED, MediaQueue
+from RESTApi.media_processing import process_image
+
+pytestmark = pytest.mark.usefixtures("upload_directories")
+
+
+def jpeg(width: int = 2000, height: int = 1000, rotated: bool = False) -> bytes:
+    image = Image.new("RGB", (width, height), "red")
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    if rotated:
+        exif[0x0112] = 6  # rotate 90 degrees
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def make_queue(**kwargs) -> MediaQueue:
+    return MediaQueue(
+        workers=1,
+        max_attempts=kwargs.pop("max_attempts", 3),
+        poll_interval=0.05,
+        job_timeout=60,
+        executor_factory=kwargs.pop("executor_factory", ThreadPoolExecutor),
+        **kwargs,
+    )
+
+
+async def upload(async_client: AsyncClient, content: bytes) -> str:
+    response = await async_client.post(
+        "/upload/stream", files={"file": ("photo.jpg", content, "image/jpeg")}
+    )
+    return response.json()["digest"]
+
+
+def test_process_image(tmp_path: Path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(jpeg(rotated=True))
+
+    result = process_image(str(source), str(tmp_path))
+
+    # the orientation tag is applied
+    assert (result["width"], result["height"]) == (1000, 2000)
+    sizes = {r["preset"]: (r["width"], r["height"]) for r in result["renditions"]}
+    assert sizes == {
+        "thumbnail": (128, 256),
+        "medium": (512, 1024),
+        "stripped": (1000, 2000),
+    }
+    stripped = result["renditions"][-1]["rendition_digest"]
+    with Image.open(tmp_path / storage.blob_relative_path(stripped)) as image:
+        assert not image.getexif()
+
+
+@pytest.mark.anyio
+async def test_upload_is_processed(async_client: AsyncClient):
+    digest = await upload(async_client, jpeg())
+    queue = make_queue()
+
+    assert await queue.process_next() is True
+    assert await queue.process_next() is False
+
+    response = await async_client.get(f"/uploads/{digest}/media")
+    assert response.json()["status"] == "done"
+    thumbnail = response.json()["renditions"][0]
+    assert (thumbnail["preset"], thumbnail["width"]) == ("thumbnail", 256)
+    rendition = await async_client.get(thumbnail["file_url"])
+    assert rendition.headers["content-type"] == "image/jpeg"
+    assert rendition.content[:2] == b"\xff\xd8"
+
+
+@pytest.mark.anyio
+async def test_non_images_are_not_queued(async_client: AsyncClient):
+    response = await async_client.post(
+        "/upload/stream", files={"file": ("notes.txt", b"text", "text/plain")}
+    )
+    media = await async_client.get(f"/uploads/{response.json()['digest']}/media")
+    assert media.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_failed_job_is_retried_then_failed(async_client: AsyncClient):
+    digest = await upload(async_client, b"not really a jpeg")
+    queue = make_queue(max_attempts=2)
+
+    await queue.process_next()
+    job = await database.fetch_one(media_job_table.select())
+    assert (job.status, job.attempts) == (QUEUED, 1)
+    assert "UnidentifiedImageError" in job.error
+
+    # due right away for the test
+    await database.execute(media_job_table.update().values(run_after=0))
+    await queue.process_next()
+    response = await async_client.get(f"/uploads/{digest}/media")
+    assert (response.json()["status"], response.json()["attempts"]) == (FAILED, 2)
+
+
+@pytest.mark.anyio
+async def test_queue_runs_in_process_pool_and_drains(async_client: AsyncClient):
+    queue = make_queue(executor_factory=MediaQueue._process_pool)
+    queue.start()
+    try:
+        digest = await upload(async_client, jpeg(400, 300))
+        await queue.enqueue(digest, "image/jpeg")
+        for _ in range(200):
+            job = await database.fetch_one(media_job_table.select())
+            if job.status == "done":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await queue.drain(timeout=5)
+
+    assert job.status == "done"
+    assert queue.stats()["completed"] == 1
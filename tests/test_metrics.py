@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from RESTApi.db import database
+from RESTApi.metrics import (
+    Registry,
+    SnapshotFiles,
+    merge,
+    render,
+)
+
+
+def test_histogram_render():
+    registry = Registry()
+    latency = registry.histogram("latency", "Latency.", ("route",), buckets=(0.1, 1))
+    latency.observe("/post", value=0.05)
+    latency.observe("/post", value=0.5)
+    latency.observe("/post", value=5)
+
+    text = render(merge([registry.snapshot()]))
+    assert "# TYPE latency histogram" in text
+    assert 'latency_bucket{route="/post",le="0.1"} 1' in text
+    assert 'latency_bucket{route="/post",le="1"} 2' in text
+    assert 'latency_bucket{route="/post",le="+Inf"} 3' in text
+    assert 'latency_sum{route="/post"} 5.55' in text
+    assert 'latency_count{route="/post"} 3' in text
+
+
+def test_render_escapes_labels():
+    registry = Registry()
+    registry.counter("hits", "Hits.", ("path",)).inc('a"b\\')
+    assert 'hits{path="a\\"b\\\\"} 1' in render(merge([registry.snapshot()]))
+
+
+def test_merge_sums_workers_and_drops_dead_gauges(mocker):
+    registry = Registry()
+    registry.counter("requests", "Requests.").inc(amount=2)
+    registry.gauge("in_flight", "In flight.").set(value=3)
+    mine = registry.snapshot()
+    dead = {**mine, "pid": os.getpid() + 1}
+    mocker.patch("RESTApi.metrics.pid_alive", return_value=False)
+
+    merged = merge([mine, dead])
+    assert merged["requests"]["values"] == {(): 4}
+    assert merged["in_flight"]["values"] == {(): 3}
+
+
+def test_snapshot_files(tmp_path):
+    registry = Registry()
+    registry.counter("requests", "Requests.").inc()
+    files = SnapshotFiles(tmp_path)
+    files.write(registry.snapshot())
+    (tmp_path / "broken.json").write_text("{")
+
+    snapshots = files.read()
+    assert [s["pid"] for s in snapshots] == [os.getpid()]
+    assert list(tmp_path.glob("*.part")) == []
+
+
+@pytest.mark.anyio
+async def test_metrics_route_templates(async_client: AsyncClient):
+    await async_client.get("/post/123/comment")
+    await async_client.get("/does-not-exist")
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert (
+        'http_requests_total{method="GET",route="/post/{post_id}/comment",status="200"}'
+        in text
+    )
+    assert '/post/123/comment"' not in text
+    assert 'route="<unmatched>",status="404"' in text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/post/{post_id}/comment"}' in text
+    )
+    assert 'pool_usage{pool="password_hash",state="workers"}' in text
+    assert "http_requests_in_flight 1" in text
+
+
+@pytest.mark.anyio
+async def test_metrics_unknown_method(async_client: AsyncClient):
+    await async_client.request("BREW", "/post")
+
+    text = (await async_client.get("/metrics")).text
+    assert 'method="other"' in text
+    assert "BREW" not in text
+
+
+@pytest.mark.anyio
+async def test_metrics_db_connections(async_client: AsyncClient, mocker):
+    mocker.patch.object(database, "connections_in_use", 2)
+    mocker.patch.object(database, "connections_opened", 7)
+
+    text = (await async_client.get("/metrics")).text
+    assert 'db_connections_in_use{database="primary"} 2' in text
+    assert 'db_connections_opened_total{database="primary"} 7' in text
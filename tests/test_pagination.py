@@ -0,0 +1,27 @@
+import pytest
+
+from RESTApi.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("most_likes", [3, 42])
+    assert decode_cursor(cursor, "most_likes") == [3, 42]
+
+
+def test_decode_cursor_wrong_sorting():
+    cursor = encode_cursor("new", [42])
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "old")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor("new", ["1"])])
+def test_decode_cursor_malformed(cursor: str):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "new")
+
+
+def test_decode_cursor_wrong_key_length():
+    cursor = encode_cursor("most_likes", [1])
+    assert cursor == "eyJzIjoibW9zdF9saWtlcyIsImsiOlsxXX0"
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "most_likes", 2)
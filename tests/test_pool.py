@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from RESTApi.pool import BoundedThreadPool, ConcurrencyLimit, PoolSaturatedError
+
+
+@pytest.fixture()
+def pool():
+    pool = BoundedThreadPool("test", max_workers=1, queue_timeout=0.05)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.anyio
+async def test_run(pool: BoundedThreadPool):
+    assert await pool.run(pow, 2, 3) == 8
+    assert pool.stats() == {
+        "workers": 1,
+        "in_flight": 0,
+        "waiting": 0,
+        "completed": 1,
+        "rejected": 0,
+    }
+
+
+@pytest.mark.anyio
+async def test_run_saturated(pool: BoundedThreadPool):
+    release = threading.Event()
+    blocked = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(PoolSaturatedError):
+        await pool.run(pow, 2, 3)
+    assert pool.rejected == 1
+
+    release.set()
+    await blocked
+
+
+@pytest.mark.anyio
+async def test_concurrency_limit():
+    limit = ConcurrencyLimit("test", limit=1, queue_timeout=0.05)
+
+    async with limit.slot():
+        assert limit.stats()["in_flight"] == 1
+        with pytest.raises(PoolSaturatedError):
+            async with limit.slot():
+                pass
+
+    async with limit.slot():
+        pass
+    assert limit.stats() == {"limit": 1, "in_flight": 0, "rejected": 1}
@@ -0,0 +1,133 @@
+import fnmatch
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from RESTApi.db import database
+from RESTApi.response_cache import (
+    CachedResponse,
+    MemoryBackend,
+    RedisBackend,
+    ResponseCache,
+)
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis used by RedisBackend."""
+
+    def __init__(self) -> None:
+        self.data: dict = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request) -> ResponseCache:
+    if request.param == "memory":
+        return ResponseCache(MemoryBackend(maxsize=8, ttl=60))
+    return ResponseCache(RedisBackend(FakeRedis(), ttl=60))
+
+
+def test_cached_response_round_trip():
+    cached = CachedResponse(body=b'[{"id":1}]', headers={"X-Next-Cursor": "abc"})
+    assert CachedResponse.from_bytes(cached.to_bytes()) == cached
+
+
+@pytest.mark.anyio
+async def test_get_set(cache: ResponseCache):
+    assert await cache.get("a") is None
+    await cache.set("a", b"[]", tags=["t"], headers={"X-Test": "1"})
+    response = await cache.get("a")
+    assert response.body == b"[]"
+    assert response.headers["X-Test"] == "1"
+    assert response.media_type == "application/json"
+
+
+@pytest.mark.anyio
+async def test_invalidate_only_tagged_keys(cache: ResponseCache):
+    await cache.set("a", b"1", tags=["t1"])
+    await cache.set("b", b"2", tags=["t1", "t2"])
+    await cache.set("c", b"3", tags=["t3"])
+
+    await cache.invalidate("t1")
+
+    assert await cache.get("a") is None
+    assert await cache.get("b") is None
+    assert (await cache.get("c")).body == b"3"
+
+
+@pytest.mark.anyio
+async def test_invalidated_at(cache: ResponseCache):
+    assert await cache.invalidated_at() == 0
+    before = time.time()
+    await cache.invalidate("t1")
+    assert before <= await cache.invalidated_at() <= time.time()
+
+
+@pytest.mark.anyio
+async def test_clear(cache: ResponseCache):
+    await cache.set("a", b"1", tags=["t1"])
+    await cache.clear()
+    assert await cache.get("a") is None
+
+
+@pytest.mark.anyio
+async def test_no_backend():
+    cache = ResponseCache(None)
+    response = await cache.set("a", b"1", tags=["t1"])
+    assert response.body == b"1"
+    assert await cache.get("a") is None
+
+
+@pytest.mark.anyio
+async def test_post_listing_is_cached_until_create_post(
+    async_client: AsyncClient, logged_in_token: str, mocker
+):
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    spy = mocker.spy(database, "fetch_all")
+
+    await async_client.get("/post")
+    first = await async_client.get("/post")
+    assert first.json() == []
+    assert spy.call_count == 1
+
+    await async_client.post("/post", json={"body": "Test Post"}, headers=headers)
+    second = await async_client.get("/post")
+    assert [post["body"] for post in second.json()] == ["Test Post"]
+    assert spy.call_count == 2
+
+
+@pytest.mark.anyio
+async def test_like_invalidates_post_detail(
+    async_client: AsyncClient, logged_in_token: str
+):
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    await async_client.post("/post", json={"body": "Test Post"}, headers=headers)
+    assert (await async_client.get("/post/1")).json()["post"]["likes"] == 0
+
+    await async_client.post("/like", json={"post_id": 1}, headers=headers)
+
+    assert (await async_client.get("/post/1")).json()["post"]["likes"] == 1
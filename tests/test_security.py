@@ -3,6 +3,7 @@ from jose import JWTError, jwt
 
 import RESTApi
 from RESTApi import security
+from RESTApi.cache import TTLCache
 
 
 def test_access_token_expire_minutes():
@@ -101,3 +102,50 @@ async def test_get_current_user_invalid_token():
 @pytest.mark.anyio
 async def test_get_current_user_wrong_type_token(registered_user: dict):
     token = security.create_confirmation_token(registered_user["email"])
+
+
+@pytest.mark.anyio
+async def test_get_current_user_is_cached(registered_user: dict, mocker):
+    spy = mocker.spy(security, "get_user")
+    token = security.create_access_token(registered_user["email"])
+    await security.get_current_user(token)
+    user = await security.get_current_user(token)
+    assert user.email == registered_user["email"]
+    assert spy.call_count == 1
+
+
+def test_get_subject_for_token_type_decodes_once(mocker):
+    spy = mocker.spy(jwt, "decode")
+    token = security.create_access_token("test@example.com")
+    # a token minted in the same second by another test is the same string
+    security.token_cache.clear()
+    security.get_subject_for_token_type(token, "access")
+    assert "test@example.com" == security.get_subject_for_token_type(token, "access")
+    assert spy.call_count == 1
+
+
+def test_get_subject_for_token_type_cached_wrong_type():
+    token = security.create_confirmation_token("test@example.com")
+    security.get_subject_for_token_type(token, "confirmation")
+    with pytest.raises(security.HTTPException) as exc_info:
+        security.get_subject_for_token_type(token, "access")
+    assert "incorrect type" in exc_info.value.detail
+
+
+def test_decode_token_entry_expires_with_token(mocker):
+    now = [0.0]
+    mocker.patch.object(
+        security, "token_cache", TTLCache(maxsize=8, ttl=300, timer=lambda: now[0])
+    )
+    spy = mocker.spy(jwt, "decode")
+    mocker.patch("RESTApi.security.access_token_expire_minutes", return_value=1)
+    token = security.create_access_token("test@example.com")
+
+    security.decode_token(token)
+    now[0] = 59
+    security.decode_token(token)
+    assert spy.call_count == 1
+
+    now[0] = 61
+    security.decode_token(token)
+    assert spy.call_count == 2
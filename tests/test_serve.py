@@ -0,0 +1,72 @@
+import os
+
+from RESTApi.config import DevConfig, TestConfing
+from RESTApi.serve import (
+    disable_memory_cache,
+    migrate_once,
+    server_options,
+    share_metrics,
+    worker_count,
+)
+
+
+def test_worker_count_defaults_to_cores(mocker):
+    mocker.patch("RESTApi.serve.os.cpu_count", return_value=8)
+    assert worker_count(None) == 8
+    assert worker_count(3) == 3
+
+
+def test_server_options():
+    config = TestConfing(SERVER_WORKERS=2, SERVER_GRACEFUL_TIMEOUT_SECONDS=10)
+    options = server_options(config)
+    assert options["workers"] == 2
+    assert options["timeout_graceful_shutdown"] == 10
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+
+
+def test_server_options_workers_override():
+    assert server_options(TestConfing(SERVER_WORKERS=2), workers=5)["workers"] == 5
+
+
+def test_share_metrics(mocker, tmp_path):
+    mocker.patch.dict("RESTApi.serve.os.environ")
+    mocker.patch("RESTApi.serve.tempfile.mkdtemp", return_value=str(tmp_path))
+    assert share_metrics(1) is None
+    assert "TEST_METRICS_DIR" not in os.environ
+    assert share_metrics(4) == str(tmp_path)
+    assert os.environ["TEST_METRICS_DIR"] == str(tmp_path)
+
+
+def test_disable_memory_cache(mocker):
+    mocker.patch.dict("RESTApi.serve.os.environ")
+    mocker.patch("RESTApi.serve.config.RESPONSE_CACHE_BACKEND", "memory")
+    assert not disable_memory_cache(1)
+    assert "TEST_RESPONSE_CACHE_BACKEND" not in os.environ
+    assert disable_memory_cache(4)
+    assert os.environ["TEST_RESPONSE_CACHE_BACKEND"] == "none"
+
+
+def test_disable_memory_cache_keeps_redis(mocker):
+    mocker.patch.dict("RESTApi.serve.os.environ")
+    mocker.patch("RESTApi.serve.config.RESPONSE_CACHE_BACKEND", "redis")
+    assert not disable_memory_cache(4)
+
+
+def test_migrate_once(mocker, tmp_path):
+    mocker.patch.dict("RESTApi.serve.os.environ")
+    mocker.patch("RESTApi.serve.config.DATABASE_URL", f"sqlite:///{tmp_path}/db")
+    migrate_url = mocker.patch(
+        "RESTApi.db.migrations.migrate_url", mocker.AsyncMock(return_value=[])
+    )
+    migrate_once()
+    migrate_url.assert_awaited_once_with(f"sqlite:///{tmp_path}/db")
+    assert os.environ["TEST_DB_MIGRATE_ON_STARTUP"] == "false"
+
+
+def test_workers_do_not_migrate_by_default():
+    assert TestConfing().DB_MIGRATE_ON_STARTUP is False
+
+
+def test_dev_server_migrates_on_startup():
+    assert DevConfig().DB_MIGRATE_ON_STARTUP is True
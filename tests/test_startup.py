@@ -0,0 +1,21 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from tests.benchmarks.bench_startup import DEFERRED_MODULES
+
+
+def test_app_import_defers_heavy_modules():
+    # a fresh interpreter, the test session has already imported everything
+    code = (
+        "import sys, main; "
+        f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"